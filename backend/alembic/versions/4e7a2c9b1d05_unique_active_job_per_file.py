@@ -0,0 +1,45 @@
+"""Unique active job per file
+
+Revision ID: 4e7a2c9b1d05
+Revises: 9b1f4c2d7e3a
+Create Date: 2026-10-18 16:40:12.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7a2c9b1d05'
+down_revision: Union[str, None] = '9b1f4c2d7e3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep only the newest active job of each file, the index rejects the others
+    op.execute(
+        """
+        UPDATE jobs SET status = 'failed', locked_at = NULL,
+            error = 'Superseded by a newer job for the file'
+        WHERE status IN ('queued', 'running') AND file_id IS NOT NULL
+          AND id NOT IN (
+            SELECT DISTINCT ON (file_id) id FROM jobs
+            WHERE status IN ('queued', 'running') AND file_id IS NOT NULL
+            ORDER BY file_id, created_at DESC
+          )
+        """
+    )
+    op.create_index(
+        'ux_jobs_active_file_id',
+        'jobs',
+        ['file_id'],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_jobs_active_file_id', table_name='jobs')
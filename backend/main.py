@@ -3,15 +3,13 @@ from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Backgroun
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import asyncio
 import shutil
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
 
-from config.database import get_db, engine
+from config.database import get_db, engine, async_engine
 from models.database_models import Base, Category, File as DBFile, User
-from services.document_analyzer import DocumentAnalyzer
-from services.document_summarizer import DocumentSummarizer
 from utils.auth import (
     verify_token,
     create_access_token,
@@ -22,17 +20,33 @@ from utils.auth import (
 from pydantic import BaseModel
 from typing import Optional
 import logging
-from routers import users, categories, files
+from routers import users, categories, files, chat
 from services.news_service import NewsService
 from models.news_models import NewsResponse
-from services.file_processor import FileProcessor
+from services.job_queue import get_job_queue
+from services.document_pipeline import PROCESS_FILE_JOB, process_file_job
+from utils.highlight_renderer import highlight_renderer
 
 logger = logging.getLogger(__name__)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+job_queue = get_job_queue()
+job_queue.register(PROCESS_FILE_JOB, process_file_job)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only the in-memory backend runs workers inside the API process
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    highlight_renderer.shutdown()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -44,14 +58,12 @@ app.add_middleware(
 )
 
 # Initialize services
-document_analyzer = DocumentAnalyzer()
-document_summarizer = DocumentSummarizer()
 news_service = NewsService()
-file_processor = FileProcessor()
 # Include routers
 app.include_router(users.router)
 app.include_router(categories.router)
 app.include_router(files.router)
+app.include_router(chat.router)
 
 
 # Pydantic models
@@ -108,70 +120,6 @@ class Token(BaseModel):
     token_type: str
 
 
-async def process_file(
-    file_path: str, file_id: str, db: Session, categories: List[dict]
-):
-    logger.info(f"Processing file {file_id}")
-    # db = Session(engine)
-    try:
-
-        # Get fresh categories from database
-        # categories = (
-        #     db.query(Category).filter(Category.id.in_([c.id for c in categories])).all()
-        # )
-
-        # Run analyzer and summarizer concurrently
-        analyzer_task = asyncio.create_task(
-            document_analyzer.analyze_document(file_path)
-        )
-
-        summarizer_task = asyncio.create_task(
-            document_summarizer.analyze_document(
-                file_path, [c["name"] for c in categories]
-            )
-        )
-        file_processor_task = asyncio.create_task(
-            file_processor.process_file(file_path)
-        )
-
-        analyzer_result, summarizer_result, file_processor_result = (
-            await asyncio.gather(analyzer_task, summarizer_task, file_processor_task)
-        )
-
-        # Update database with results
-        file = db.query(DBFile).filter(DBFile.id == file_id).first()
-        if file:
-            file.highlighted_filename = os.path.basename(
-                analyzer_result["highlighted_path"]
-            )
-            file.summary = (
-                summarizer_result.full_summary
-                if hasattr(summarizer_result, "full_summary")
-                else str(summarizer_result)
-            )
-            category_name = (
-                summarizer_result.classification.category
-                if hasattr(summarizer_result, "classification")
-                else None
-            )
-            logger.info(f"Categories: {categories}")
-            logger.info(f"Category name: {category_name}")
-            for cat in categories:
-
-                if cat["name"] == category_name:
-                    file.category_id = cat["id"]
-                    logger.info(f"Category id: {cat['id']}")
-                    break
-
-            print(file.summary)
-            db.commit()
-
-    except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
-    finally:
-        db.close()
-
-
 @app.get("/news/", response_model=NewsResponse)
 async def get_news(
     page: int = 1,
@@ -179,7 +127,7 @@ async def get_news(
     current_user: User = Depends(verify_token),
 ):
     """Get paginated news articles based on user preferences"""
-    return news_service.get_articles(
+    return await news_service.get_articles(
         user_id=current_user["user_id"], page=page, preferred_categories=categories
     )
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import List, Literal, Tuple
 
 
 class HighlightType(BaseModel):
@@ -26,3 +26,22 @@ class DocumentAnalysis(BaseModel):
     )
     total_pages: int = Field(description="Total number of pages in the document")
     document_title: str = Field(description="Title or filename of the document")
+
+
+class AnchorMatch(BaseModel):
+    """Where a highlight's content was found in a document's text"""
+
+    start: int = Field(description="Offset of the first matched character")
+    end: int = Field(description="Offset after the last matched character")
+    segment: int = Field(description="Page, paragraph or run group the match starts in")
+    score: float = Field(description="Similarity to the content, 1.0 for exact matches")
+
+
+class HighlightPlacement(BaseModel):
+    """Rectangles to highlight on one PDF page for one highlight"""
+
+    page: int = Field(description="Zero-based page number")
+    score: float = Field(description="Score of the match the page text belongs to")
+    rects: List[Tuple[float, float, float, float]] = Field(
+        description="Rectangles covering the matched text, as (x0, y0, x1, y1)"
+    )
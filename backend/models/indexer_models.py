@@ -0,0 +1,68 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Union
+from qdrant_client.models import (
+    BinaryQuantization,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    SearchParams,
+)
+
+
+class StorageProfile(BaseModel):
+    """How the dense vectors of a collection are stored and searched"""
+
+    name: str = Field(description="Name used in QDRANT_STORAGE_PROFILE")
+    on_disk: bool = Field(
+        default=False, description="Keep the original float32 vectors on disk"
+    )
+    quantization: Optional[Union[ScalarQuantization, BinaryQuantization]] = Field(
+        default=None, description="Compressed copy of the vectors kept in RAM"
+    )
+    search: Optional[QuantizationSearchParams] = Field(
+        default=None,
+        description="Oversampling and rescoring applied to quantized searches",
+    )
+    bytes_per_dimension: float = Field(
+        default=4, description="RAM used per vector dimension, for estimates"
+    )
+
+    def search_params(self, exact: bool = False) -> Optional[SearchParams]:
+        """Dense search parameters for this profile, or for an exact scan"""
+        if exact:
+            return SearchParams(
+                exact=True, quantization=QuantizationSearchParams(ignore=True)
+            )
+        if self.search is None:
+            return None
+        return SearchParams(quantization=self.search)
+
+
+class RecallReport(BaseModel):
+    """Recall of the configured search measured against exact search"""
+
+    profile: str = Field(description="Storage profile the recall was measured for")
+    samples: int = Field(description="Number of query vectors sampled")
+    k: int = Field(description="Number of neighbours compared per query")
+    recall: float = Field(description="Mean share of exact neighbours found")
+
+
+class SearchFilter(BaseModel):
+    """Restricts a search to one user's chunks, optionally to files or a category"""
+
+    user_id: str = Field(description="Owner of the chunks")
+    file_ids: Optional[List[str]] = Field(
+        default=None, description="Only chunks of these files"
+    )
+    category_id: Optional[str] = Field(
+        default=None, description="Only chunks of files in this category"
+    )
+
+
+class ScoredChunk(BaseModel):
+    """A chunk returned by one retriever of a vector backend"""
+
+    id: int = Field(description="Point id of the chunk")
+    score: float = Field(description="Retriever score, higher is better")
+    payload: Dict[str, Any] = Field(
+        description="Chunk payload with page_content and metadata"
+    )
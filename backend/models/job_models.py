@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class JobInfo(BaseModel):
+    """Snapshot of a background job's state"""
+
+    id: str = Field(description="Job id")
+    kind: str = Field(description="Name of the handler that runs the job")
+    payload: Dict[str, Any] = Field(description="Arguments passed to the handler")
+    status: str = Field(description="One of queued, running, succeeded or failed")
+    attempts: int = Field(description="Number of times the job has been started")
+    max_attempts: int = Field(description="Attempts allowed before the job fails")
+    error: Optional[str] = Field(default=None, description="Error of the last attempt")
+    file_id: Optional[str] = Field(default=None, description="File the job works on")
+    user_id: str = Field(description="User who owns the job")
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class Chunk(BaseModel):
+    """A run of consecutive document elements sized for one consumer"""
+
+    text: str = Field(description="Text of the elements joined by newlines")
+    pages: List[int] = Field(
+        default_factory=list, description="Page or slide numbers the chunk spans"
+    )
+    section: Optional[str] = Field(
+        default=None, description="Title of the section the chunk starts in"
+    )
+
+
+class ParsedDocument(BaseModel):
+    """Result of parsing a document once, shared by every processing stage"""
+
+    file_path: str = Field(description="Path of the parsed file")
+    file_hash: str = Field(description="SHA-256 hash of the file contents")
+    elements: List[Dict[str, Any]] = Field(
+        description="Raw elements returned by the Unstructured partition API"
+    )
+    text: str = Field(description="Text of all elements joined by newlines")
+    chunks: Dict[str, List[Chunk]] = Field(
+        default_factory=dict,
+        description="Chunks per consumer (index, analysis, summary) from one pass",
+    )
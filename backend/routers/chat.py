@@ -0,0 +1,40 @@
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from schemas.chat import ChatRequest
+from services.agent import DocumentAgent
+from utils.auth import verify_token
+
+router = APIRouter(prefix="/chat", tags=["chat"])
+
+_agent: Optional[DocumentAgent] = None
+
+
+def get_agent() -> DocumentAgent:
+    """Return the shared agent, creating it on first use"""
+    global _agent
+    if _agent is None:
+        _agent = DocumentAgent()
+    return _agent
+
+
+async def to_sse(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Format agent events as Server-Sent Events"""
+    async for event in events:
+        yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+@router.post("/")
+async def chat(
+    request: ChatRequest,
+    current_user: dict = Depends(verify_token),
+    agent: DocumentAgent = Depends(get_agent),
+):
+    return StreamingResponse(
+        to_sse(agent.astream_events(request.message, current_user["user_id"])),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
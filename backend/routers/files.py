@@ -1,36 +1,48 @@
 import os
 import shutil
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from config.database import get_db, engine
+from config.database import get_async_db
 from models.database_models import Category, File as DBFile
-from schemas.file import KFileResponse
+from models.database_models import JobStatus
+from schemas.file import KFileResponse, FileStatusResponse
 from utils.auth import verify_token
-from services.file_processor import process_file
+from services.job_queue import JobConflictError, get_job_queue
+from services.document_pipeline import PROCESS_FILE_JOB
 
 router = APIRouter(prefix="/files", tags=["files"])
 
 
-@router.post("/", response_model=KFileResponse)
-async def upload_file(
-    file: UploadFile,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_token),
-):
-    categories = (
-        db.query(Category).filter(Category.user_id == current_user["user_id"]).all()
+async def _user_file(db: AsyncSession, file_id: str, user_id: str) -> DBFile:
+    return await db.scalar(
+        select(DBFile).where(DBFile.id == file_id, DBFile.user_id == user_id)
     )
+
+
+async def _user_categories(db: AsyncSession, user_id: str) -> List[dict]:
+    """The user's categories as job payload dicts, 404 when there are none"""
+    categories = await db.scalars(select(Category).where(Category.user_id == user_id))
     categories = [
         {"id": cat.id, "name": cat.name, "user_id": cat.user_id} for cat in categories
     ]
 
     if not categories:
         raise HTTPException(status_code=404, detail="No categories found")
+    return categories
+
+
+@router.post("/", response_model=KFileResponse)
+async def upload_file(
+    file: UploadFile,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(verify_token),
+):
+    categories = await _user_categories(db, current_user["user_id"])
 
     upload_dir = "uploads"
     os.makedirs(upload_dir, exist_ok=True)
@@ -47,33 +59,42 @@ async def upload_file(
         user_id=current_user["user_id"],
     )
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
-
-    background_tasks.add_task(process_file, file_path, db_file.id, db, categories)
+    await db.commit()
+    await db.refresh(db_file)
+
+    # Processing runs in the worker pool, outside this request and its session
+    await get_job_queue().enqueue(
+        PROCESS_FILE_JOB,
+        {
+            "file_path": file_path,
+            "file_id": db_file.id,
+            "user_id": current_user["user_id"],
+            "categories": categories,
+        },
+        user_id=current_user["user_id"],
+        file_id=db_file.id,
+    )
     return db_file
 
 
 @router.get("/", response_model=List[KFileResponse])
 async def get_files(
-    db: Session = Depends(get_db), current_user: dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(verify_token)
 ):
-    files = db.query(DBFile).filter(DBFile.user_id == current_user["user_id"]).all()
+    files = await db.scalars(
+        select(DBFile).where(DBFile.user_id == current_user["user_id"])
+    )
 
-    return files
+    return files.all()
 
 
 @router.get("/{file_id}")
 async def get_file(
     file_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(verify_token),
 ):
-    file = (
-        db.query(DBFile)
-        .filter(DBFile.id == file_id, DBFile.user_id == current_user["user_id"])
-        .first()
-    )
+    file = await _user_file(db, file_id, current_user["user_id"])
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
@@ -81,17 +102,41 @@ async def get_file(
     return FileResponse(file_path, filename=file.original_filename)
 
 
+@router.get("/{file_id}/status", response_model=FileStatusResponse)
+async def get_file_status(
+    file_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(verify_token),
+):
+    file = await _user_file(db, file_id, current_user["user_id"])
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    job = await get_job_queue().get_file_job(file_id)
+    if job is None:
+        # Files uploaded before the job queue existed have no job
+        status = (
+            JobStatus.SUCCEEDED.value if file.highlighted_filename else "unknown"
+        )
+        return FileStatusResponse(file_id=file_id, status=status)
+
+    return FileStatusResponse(
+        file_id=file_id,
+        status=job.status,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        error=job.error,
+        updated_at=job.updated_at,
+    )
+
+
 @router.get("/{file_id}/highlighted")
 async def get_highlighted_file(
     file_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(verify_token),
 ):
-    file = (
-        db.query(DBFile)
-        .filter(DBFile.id == file_id, DBFile.user_id == current_user["user_id"])
-        .first()
-    )
+    file = await _user_file(db, file_id, current_user["user_id"])
     if not file or not file.highlighted_filename:
         raise HTTPException(status_code=404, detail="Highlighted file not found")
 
@@ -99,17 +144,43 @@ async def get_highlighted_file(
     return FileResponse(file_path, filename=f"highlighted_{file.original_filename}")
 
 
+@router.post("/{file_id}/reanalyze", response_model=FileStatusResponse)
+async def reanalyze_file(
+    file_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(verify_token),
+):
+    """Process a file again, only changed highlights are redrawn"""
+    file = await _user_file(db, file_id, current_user["user_id"])
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    categories = await _user_categories(db, current_user["user_id"])
+    try:
+        await get_job_queue().enqueue(
+            PROCESS_FILE_JOB,
+            {
+                "file_path": os.path.join("uploads", file.stored_filename),
+                "file_id": file.id,
+                "user_id": current_user["user_id"],
+                "categories": categories,
+            },
+            user_id=current_user["user_id"],
+            file_id=file.id,
+        )
+    except JobConflictError:
+        # Two jobs would update the same highlighted copy at once
+        raise HTTPException(status_code=409, detail="File is already being processed")
+    return FileStatusResponse(file_id=file_id, status=JobStatus.QUEUED.value)
+
+
 @router.delete("/{file_id}")
 async def delete_file(
     file_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(verify_token),
 ):
-    file = (
-        db.query(DBFile)
-        .filter(DBFile.id == file_id, DBFile.user_id == current_user["user_id"])
-        .first()
-    )
+    file = await _user_file(db, file_id, current_user["user_id"])
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
@@ -121,6 +192,6 @@ async def delete_file(
     except OSError:
         pass
 
-    db.delete(file)
-    db.commit()
+    await db.delete(file)
+    await db.commit()
     return {"message": "File deleted"}
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from config.database import get_db
+from config.database import get_async_db
 from models.database_models import User
 from schemas.user import (
     UserCreate,
@@ -18,28 +19,29 @@ from utils.auth import (
     verify_password,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from services.news_service import user_category_cache
 from typing import List
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.post("/register", response_model=UserResponse)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     hashed_password = get_password_hash(user.password)
     db_user = User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/login", response_model=Token)
-async def login_user(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def login_user(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if not db_user or not verify_password(user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
@@ -52,9 +54,10 @@ async def login_user(user: UserLogin, db: Session = Depends(get_db)):
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
-    current_user: dict = Depends(verify_token), db: Session = Depends(get_db)
+    current_user: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = db.query(User).filter(User.id == current_user["user_id"]).first()
+    user = await db.get(User, current_user["user_id"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -62,14 +65,16 @@ async def get_current_user(
 
 @router.delete("/me")
 async def delete_current_user(
-    current_user: dict = Depends(verify_token), db: Session = Depends(get_db)
+    current_user: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_async_db),
 ):
     print(current_user)
-    user = db.query(User).filter(User.id == current_user["user_id"]).first()
+    user = await db.get(User, current_user["user_id"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    user_category_cache.invalidate(user.id)
     return {"message": "User deleted"}
 
 
@@ -77,8 +82,10 @@ async def delete_current_user(
 async def update_user_newcategories(
     categories: UserNewCategoriesUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     current_user.newcategories = categories.categories_string.split(",")
-    db.commit()
+    await db.commit()
+    # The news feed reads the new categories on its next request
+    user_category_cache.invalidate(current_user.id)
     return current_user.newcategories
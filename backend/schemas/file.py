@@ -13,4 +13,13 @@ class KFileResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+
+class FileStatusResponse(BaseModel):
+    file_id: str
+    status: str
+    attempts: int = 0
+    max_attempts: Optional[int] = None
+    error: Optional[str] = None
+    updated_at: Optional[datetime] = None
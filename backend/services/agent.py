@@ -2,7 +2,8 @@ import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from typing import TypedDict, Annotated, Dict, Any
+import asyncio
+from typing import TypedDict, Annotated, AsyncIterator, Dict, Any
 import operator
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import (
@@ -12,6 +13,7 @@ from langchain_core.messages import (
     ToolMessage,
     AIMessage,
 )
+from langchain_core.tools import BaseTool
 from langchain_openai import ChatOpenAI
 from langchain_community.tools.tavily_search import TavilySearchResults
 from services.indexer import Indexer
@@ -27,6 +29,8 @@ class AgentState(TypedDict):
     """State for the document agent."""
 
     messages: Annotated[list[AnyMessage], operator.add]
+    # Owner of the conversation, tools only see this user's documents
+    user_id: str
 
 
 class DocumentAgent:
@@ -36,14 +40,6 @@ class DocumentAgent:
         # Initialize tools
         self.indexer = Indexer(collection_name="documents")
         print(os.getenv("TAVILY_API_KEY"))
-        self.tools_dict = {
-            "document_search": self.indexer.as_tool(),
-            # "web_search": TavilySearchResults(
-            #     # tavily_api_key=os.getenv("TAVILY_API_KEY"),
-            #     max_results=3,
-            #     description="Use for finding supplementary information from the web when documents don't contain enough context.",
-            # ),
-        }
 
         # Initialize model
         self.model = ChatOpenAI(model="gpt-4o-mini", temperature=0, streaming=True)
@@ -58,7 +54,8 @@ class DocumentAgent:
         Follow these guidelines:
         1. For document queries:
            - First use document_search to find relevant information
-           - Cite specific documents when providing information
+           - Cite specific documents when providing information, with the page
+             numbers and section given in each result's metadata
            
         
            
@@ -71,83 +68,106 @@ class DocumentAgent:
         # Build graph
         self.graph = self.build_graph()
 
+    def get_tools(self, user_id: str) -> Dict[str, BaseTool]:
+        """Return the tools available to a user, keyed by name"""
+        return {
+            "document_search": self.indexer.as_tool(user_id),
+            # "web_search": TavilySearchResults(
+            #     # tavily_api_key=os.getenv("TAVILY_API_KEY"),
+            #     max_results=3,
+            #     description="Use for finding supplementary information from the web when documents don't contain enough context.",
+            # ),
+        }
+
     def exists_action(self, state: AgentState) -> bool:
         """Check if there are any tool calls to make."""
         result = state["messages"][-1]
         return hasattr(result, "tool_calls") and len(result.tool_calls) > 0
 
-    def call_llm(self, state: AgentState) -> AgentState:
+    async def call_llm(self, state: AgentState) -> AgentState:
         """Call the LLM with the current state."""
         messages = state["messages"][-10:]  # Limit context window
 
         if self.system_prompt:
             messages = [SystemMessage(content=self.system_prompt)] + messages
 
+        # The state reducer appends, so only the new message is returned
         try:
-            message = self.model.bind_tools(self.tools_dict.values()).invoke(messages)
-            print(message)
-            return {"messages": state["messages"] + [message]}
+            tools = self.get_tools(state["user_id"]).values()
+            message = await self.model.bind_tools(tools).ainvoke(messages)
+            return {"messages": [message]}
         except Exception as e:
             logger.error(f"Error in call_llm: {type(e).__name__} - {str(e)}")
             return {
-                "messages": state["messages"]
-                + [AIMessage(content=f"Sorry, I encountered an error: {str(e)}")]
+                "messages": [
+                    AIMessage(content=f"Sorry, I encountered an error: {str(e)}")
+                ]
             }
 
-    def take_action(self, state: AgentState) -> AgentState:
-        """Execute tool calls from the LLM."""
-        tool_calls = state["messages"][-1].tool_calls
-        if not tool_calls:
-            return {"messages": state["messages"]}
-
-        results = []
-        for tool_call in tool_calls:
-            tool_name = (
-                tool_call.function.name
-                if hasattr(tool_call, "function")
-                else tool_call.get("name")
+    @staticmethod
+    def _tool_input(tool_call: Dict[str, Any]) -> str:
+        """Return the single string argument of a tool call"""
+        args = tool_call.get("args", {})
+        if isinstance(args, dict):
+            return str(next(iter(args.values()), ""))
+        return str(args)
+
+    async def run_tool_call(
+        self, tool_call: Dict[str, Any], tools: Dict[str, BaseTool]
+    ) -> ToolMessage:
+        """Run one tool call, turning failures into error messages for the LLM"""
+        tool_name = tool_call.get("name")
+        if tool_name == "tavily_search_results_json":
+            tool_name = "web_search"
+
+        if not tool_name or tool_name not in tools:
+            logger.error(f"Invalid tool call: {tool_call}")
+            return ToolMessage(
+                tool_call_id=tool_call.get("id", ""),
+                name=tool_name or "unknown",
+                content="Error: Invalid tool call",
             )
-            if tool_name == "tavily_search_results_json":
-                tool_name = "web_search"
-
-            if not tool_name or tool_name not in self.tools_dict:
-                logger.error(f"Invalid tool call: {tool_call}")
-                results.append(
-                    ToolMessage(
-                        tool_call_id=tool_call.get("id", ""),
-                        name=tool_name or "unknown",
-                        content="Error: Invalid tool call",
-                    )
-                )
-                continue
 
+        try:
+            result = await tools[tool_name].ainvoke(
+                tool_call.get("args", {})
+            )
+            return ToolMessage(
+                tool_call_id=tool_call.get("id", ""),
+                name=tool_name,
+                content=str(result),
+            )
+        except Exception as e:
+            logger.error(f"Error invoking tool {tool_name}: {e}")
+            return ToolMessage(
+                tool_call_id=tool_call.get("id", ""),
+                name=tool_name,
+                content=f"Error: {str(e)}",
+            )
+
+    async def take_action(self, state: AgentState) -> AgentState:
+        """Execute tool calls from the LLM concurrently."""
+        tool_calls = state["messages"][-1].tool_calls
+        if not tool_calls:
+            return {"messages": []}
+
+        # Embed every search query in one batch; the searches then hit the cache
+        queries = [
+            self._tool_input(tool_call)
+            for tool_call in tool_calls
+            if tool_call.get("name") == "document_search"
+        ]
+        if len(queries) > 1:
             try:
-                tool = self.tools_dict[tool_name]
-                arguments = (
-                    tool_call.function.arguments
-                    if hasattr(tool_call, "function")
-                    else tool_call.get("arguments", "")
-                )
-                result = tool.invoke(arguments)
-                print(result)
-                results.append(
-                    ToolMessage(
-                        tool_call_id=tool_call.get("id", ""),
-                        name=tool_name,
-                        content=str(result),
-                    )
-                )
+                await self.indexer.aembed_queries(queries)
             except Exception as e:
-                logger.error(f"Error invoking tool {tool_name}: {e}")
-                results.append(
-                    ToolMessage(
-                        tool_call_id=tool_call.get("id", ""),
-                        name=tool_name,
-                        content=f"Error: {str(e)}",
-                    )
-                )
+                logger.error(f"Error embedding search queries: {e}")
 
-        return {"messages": results}
+        tools = self.get_tools(state["user_id"])
+        results = await asyncio.gather(
+            *(self.run_tool_call(tool_call, tools) for tool_call in tool_calls)
+        )
+        return {"messages": list(results)}
 
     def build_graph(self) -> StateGraph:
         """Build the agent's workflow graph."""
@@ -168,31 +188,73 @@ class DocumentAgent:
 
         return graph.compile()
 
-    def stream(self, query: str):
+    def astream(self, query: str, user_id: str):
         """Stream the agent's response."""
         messages = [HumanMessage(content=query)]
-        return self.graph.stream({"messages": messages})
+        return self.graph.astream({"messages": messages, "user_id": user_id})
 
-    async def query(self, user_query: str) -> str:
-        """Query documents and generate a response"""
+    async def query(self, user_query: str, user_id: str) -> str:
+        """Query a user's documents and generate a response"""
         try:
             messages = [HumanMessage(content=user_query)]
-            result = self.graph.invoke({"messages": messages})
+            result = await self.graph.ainvoke(
+                {"messages": messages, "user_id": user_id}
+            )
             return result["messages"][-1].content
         except Exception as e:
             logger.error(f"Error in document query: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
 
+    async def astream_events(
+        self, user_query: str, user_id: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream LLM tokens and tool activity for a query on a user's documents
+
+        Yields dicts with an "event" of token, tool_start, tool_end, error or end
+        and the matching "data".
+        """
+        messages = [HumanMessage(content=user_query)]
+        try:
+            async for event in self.graph.astream_events(
+                {"messages": messages, "user_id": user_id}, version="v2"
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield {"event": "token", "data": content}
+                elif kind == "on_tool_start":
+                    yield {
+                        "event": "tool_start",
+                        "data": {
+                            "name": event["name"],
+                            "input": event["data"].get("input"),
+                        },
+                    }
+                elif kind == "on_tool_end":
+                    yield {
+                        "event": "tool_end",
+                        "data": {
+                            "name": event["name"],
+                            "output": str(event["data"].get("output")),
+                        },
+                    }
+        except Exception as e:
+            logger.error(f"Error in document query stream: {e}")
+            yield {
+                "event": "error",
+                "data": f"Sorry, I encountered an error: {str(e)}",
+            }
+        yield {"event": "end", "data": None}
+
 
 if __name__ == "__main__":
-    import asyncio
 
     async def test_agent():
         agent = DocumentAgent()
         query = " Best Path Decision Framework Best Path Analysis Prune In e Analysis Tree Publishability Assessment Review Needed Generate Reasoning Paths i — Multi-perspective Analysis Tree Visualization Publication Decision"
         print("\nStreaming Query:")
-        for event in agent.stream(query):
-            for v in event.values():
-                print(v["messages"][-1].content)
+        async for event in agent.astream_events(query, "test_user"):
+            print(event)
 
     asyncio.run(test_agent())
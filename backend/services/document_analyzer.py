@@ -2,16 +2,18 @@ import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import asyncio
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional
 from pathlib import Path
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from models.highlight_models import Highlight, DocumentAnalysis
+from models.parser_models import ParsedDocument
 from utils.parser import UnstructuredParser
-from utils.pdf_highlighter import add_highlights as add_pdf_highlights
-from utils.docx_highlighter import add_highlights as add_docx_highlights
-from utils.ppt_highlighter import add_highlights as add_ppt_highlights
+from utils.highlight_renderer import highlight_renderer
+from utils.llm_limiter import llm_limiter
+from utils.llm_cache import LLMCache, llm_cache
 
 # Configure logging
 logging.basicConfig(
@@ -19,24 +21,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bump whenever the analysis prompt changes so cached analyses are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+
 
 class DocumentAnalyzer:
     """Agent that analyzes documents to identify and highlight important information"""
 
-    def __init__(self, api_key: str = None, openai_api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        openai_api_key: str = None,
+        llm: Optional[BaseChatModel] = None,
+        cache: Optional[LLMCache] = None,
+    ):
         """Initialize the document analyzer
 
         Args:
             api_key: Unstructured API key for parsing documents
             openai_api_key: OpenAI API key for content analysis
+            llm: Chat model to use instead of the default gpt-4o-mini
+            cache: Cache for chunk analyses, defaults to the shared LLM cache
         """
         self.parser = UnstructuredParser()
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=4000,
-            chunk_overlap=200,
-            length_function=len,
+        # Retries are handled by the shared limiter, which backs off on rate limits
+        self.llm = llm or ChatOpenAI(
+            model="gpt-4o-mini", temperature=0, max_retries=0
         )
+        self.cache = cache or llm_cache
+        self.model_name = getattr(self.llm, "model_name", type(self.llm).__name__)
 
     async def analyze_chunk(self, chunk: str) -> List[Highlight]:
         """Analyze a single chunk of text"""
@@ -53,46 +66,72 @@ class DocumentAnalyzer:
         {chunk}
         """
 
-        response = await self.llm.with_structured_output(DocumentAnalysis).ainvoke(
-            prompt
+        response = await self.cache.get_or_create(
+            DocumentAnalysis,
+            self.model_name,
+            ANALYSIS_PROMPT_VERSION,
+            chunk,
+            lambda: llm_limiter.run(
+                lambda: self.llm.with_structured_output(DocumentAnalysis).ainvoke(
+                    prompt
+                )
+            ),
         )
         highlights = response.highlights
         return highlights
 
-    async def analyze_document(self, file_path: Union[str, Path]) -> Dict:
-        """Analyze a document using chunking and structured output"""
+    async def analyze_chunks(self, chunks: List[str]) -> List[List[Highlight]]:
+        """Analyze chunks concurrently within the shared LLM limit
+
+        Returns:
+            The highlights of each chunk, in chunk order
+        """
+        return await asyncio.gather(*(self.analyze_chunk(chunk) for chunk in chunks))
+
+    async def analyze_document(
+        self, file_path: Union[str, Path], parsed: Optional[ParsedDocument] = None
+    ) -> Dict:
+        """Analyze a document using chunking and structured output
+
+        Args:
+            file_path: Path to the document
+            parsed: Already parsed document, parsed here when not provided
+        """
         try:
             # Extract text and metadata from document
-            text = await self.parser.extract_text_async(file_path)
+            if parsed is None:
+                parsed = await self.parser.parse_document_async(file_path)
 
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(text)
+            chunks = parsed.chunks["analysis"]
 
-            # Analyze each chunk
-            all_highlights = []
-            for i, chunk in enumerate(chunks):
-                chunk_highlights = await self.analyze_chunk(chunk)
-                all_highlights.extend(chunk_highlights)
+            chunk_highlights = await self.analyze_chunks(
+                [chunk.text for chunk in chunks]
+            )
 
             # Create structured output
+            pages = [page for chunk in chunks for page in chunk.pages]
             analysis = DocumentAnalysis(
-                highlights=all_highlights,
-                total_pages=len(chunks),
+                highlights=[
+                    highlight
+                    for highlights in chunk_highlights
+                    for highlight in highlights
+                ],
+                total_pages=max(pages, default=len(chunks)),
                 document_title=Path(file_path).name,
             )
 
-            # Add highlights based on file type
-            file_extension = Path(file_path).suffix.lower()
-            highlight_data = [h.dict() for h in analysis.highlights]
-
-            if file_extension == ".pdf":
-                highlighted_path = add_pdf_highlights(highlight_data, str(file_path))
-            elif file_extension == ".docx":
-                highlighted_path = add_docx_highlights(highlight_data, str(file_path))
-            elif file_extension in [".ppt", ".pptx"]:
-                highlighted_path = add_ppt_highlights(highlight_data, str(file_path))
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
+            # Add highlights based on file type, with the pages of their chunk so
+            # the highlighters look there first
+            highlight_data = [
+                {**highlight.dict(), "pages": chunk.pages}
+                for chunk, highlights in zip(chunks, chunk_highlights)
+                for highlight in highlights
+            ]
+
+            # Rendering is CPU-bound, so it runs in worker processes
+            highlighted_path = await highlight_renderer.render(
+                highlight_data, str(file_path)
+            )
 
             return {
                 "message": f"Document analyzed and highlights added. Output at: {highlighted_path}",
@@ -106,8 +145,6 @@ class DocumentAnalyzer:
 
     def analyze_document_sync(self, file_path: Union[str, Path]) -> Dict:
         """Synchronous version of analyze_document"""
-        import asyncio
-
         return asyncio.run(self.analyze_document(file_path))
 
 
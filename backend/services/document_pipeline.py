@@ -0,0 +1,119 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from config.database import AsyncSessionLocal
+from models.database_models import File as DBFile
+from services.document_analyzer import DocumentAnalyzer
+from services.document_summarizer import DocumentSummarizer
+from services.file_processor import FileProcessor
+from utils.llm_cache import llm_cache
+from utils.parser import UnstructuredParser
+
+logger = logging.getLogger(__name__)
+
+PROCESS_FILE_JOB = "process_file"
+
+
+class DocumentPipeline:
+    """Runs every processing stage for an uploaded file and stores the results"""
+
+    def __init__(self):
+        self.parser = UnstructuredParser()
+        self.analyzer = DocumentAnalyzer()
+        self.summarizer = DocumentSummarizer()
+        self.file_processor = FileProcessor()
+
+    async def process_file(
+        self, file_path: str, file_id: str, user_id: str, categories: List[dict]
+    ) -> None:
+        """Highlight, summarize, classify and index a file
+
+        Args:
+            file_path: Path of the uploaded file
+            file_id: Id of the file row to update
+            user_id: Owner of the file
+            categories: The owner's categories as dicts with id and name
+
+        Raises:
+            RuntimeError: If any stage fails, so the job can be retried
+        """
+        logger.info(f"Processing file {file_id}")
+
+        # Parse once and share the elements with every stage
+        parsed = await self.parser.parse_document_async(file_path)
+
+        # Run analyzer, summarizer and indexer concurrently
+        analyzer_result, summarizer_result, file_processor_result = (
+            await asyncio.gather(
+                self.analyzer.analyze_document(file_path, parsed),
+                self.summarizer.analyze_document(
+                    file_path, [c["name"] for c in categories], parsed
+                ),
+                self.file_processor.process_file(file_path, user_id, file_id, parsed),
+            )
+        )
+        # Totals of this process, to follow how many LLM calls the cache saves
+        logger.info(f"LLM cache: {await asyncio.to_thread(llm_cache.stats)}")
+
+        # Stages report errors in their results instead of raising
+        if not analyzer_result.get("highlighted_path"):
+            raise RuntimeError(analyzer_result["message"])
+        if isinstance(summarizer_result, dict):
+            raise RuntimeError(summarizer_result["error"])
+        if file_processor_result["status"] != "success":
+            raise RuntimeError(file_processor_result["message"])
+
+        category_name = summarizer_result.classification.category
+        logger.info(f"Categories: {categories}")
+        logger.info(f"Category name: {category_name}")
+
+        category_id = next(
+            (cat["id"] for cat in categories if cat["name"] == category_name), None
+        )
+        logger.info(f"Category id: {category_id}")
+
+        # Update database with results
+        async with AsyncSessionLocal() as db:
+            file = await db.get(DBFile, file_id)
+            if not file:
+                logger.info(f"File {file_id} was deleted during processing")
+                return
+
+            file.highlighted_filename = os.path.basename(
+                analyzer_result["highlighted_path"]
+            )
+            file.summary = summarizer_result.full_summary
+            if category_id:
+                file.category_id = category_id
+
+            await db.commit()
+
+        # Let searches filter the file's chunks by category
+        if category_id:
+            await self.file_processor.indexer.set_category(file_id, category_id)
+
+
+_pipeline: Optional[DocumentPipeline] = None
+
+
+def get_document_pipeline() -> DocumentPipeline:
+    """Return the process-wide pipeline, creating its services on first use"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = DocumentPipeline()
+    return _pipeline
+
+
+async def process_file_job(payload: Dict[str, Any]) -> None:
+    """Job handler for PROCESS_FILE_JOB"""
+    await get_document_pipeline().process_file(
+        payload["file_path"],
+        payload["file_id"],
+        payload["user_id"],
+        payload["categories"],
+    )
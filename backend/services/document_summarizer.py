@@ -4,11 +4,15 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import logging
-from typing import List, Dict, Union
+from typing import AsyncIterator, Callable, List, Dict, Type, Union, Optional
 from pathlib import Path
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
 from utils.parser import UnstructuredParser
+from models.parser_models import ParsedDocument
+from utils.llm_limiter import llm_limiter
+from utils.llm_cache import llm_cache
+from utils.map_reduce import MapReduce, MapReduceProgress, stream_progress
 from models.summary_models import DocumentSummary, ChunkSummary, DocumentClassification
 from dotenv import load_dotenv
 
@@ -20,6 +24,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bump whenever a prompt changes so cached outputs for it are not reused
+CHUNK_SUMMARY_PROMPT_VERSION = "1"
+MERGE_SUMMARY_PROMPT_VERSION = "1"
+CLASSIFICATION_PROMPT_VERSION = "1"
+
 # Static categories for document classification
 DOCUMENT_CATEGORIES = [
     "Technical Documentation",
@@ -33,13 +42,22 @@ DOCUMENT_CATEGORIES = [
 class DocumentSummarizer:
     """Service that provides comprehensive document summaries and category classification using CoT"""
 
-    def __init__(self):
+    def __init__(self, reduce_group_size: int = 8, reduce_max_chars: int = 12000):
+        """Initialize the document summarizer
+
+        Args:
+            reduce_group_size: Maximum number of summaries merged by one reduce call
+            reduce_max_chars: Character budget for the summaries merged by one call
+        """
         self.parser = UnstructuredParser()
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=3000,
-            chunk_overlap=300,
-            length_function=len,
+        # Retries are handled by the shared limiter, which backs off on rate limits
+        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, max_retries=0)
+        self.map_reduce = MapReduce(
+            map_fn=self._generate_chunk_summary,
+            reduce_fn=self._merge_summaries,
+            group_size=reduce_group_size,
+            max_group_size=reduce_max_chars,
+            size_fn=self._summary_size,
         )
 
     async def _generate_chunk_summary(self, chunk: str) -> ChunkSummary:
@@ -59,7 +77,63 @@ class DocumentSummarizer:
         - A synthesized summary
         """
 
-        response = await self.llm.with_structured_output(ChunkSummary).ainvoke(prompt)
+        response = await self._cached_structured_output(
+            ChunkSummary, CHUNK_SUMMARY_PROMPT_VERSION, chunk, prompt
+        )
+        return response
+
+    async def _cached_structured_output(
+        self, schema: Type[BaseModel], prompt_version: str, cache_text: str, prompt: str
+    ) -> BaseModel:
+        """Run a structured LLM call through the shared cache and limiter"""
+        return await llm_cache.get_or_create(
+            schema,
+            self.llm.model_name,
+            prompt_version,
+            cache_text,
+            lambda: llm_limiter.run(
+                lambda: self.llm.with_structured_output(schema).ainvoke(prompt)
+            ),
+        )
+
+    @staticmethod
+    def _format_summary(summary: ChunkSummary) -> str:
+        """Render a summary with its topics and key points for a reduce prompt"""
+        key_points = "\n".join(f"- {point}" for point in summary.key_points)
+        return (
+            f"Topics: {', '.join(summary.main_topics)}\n"
+            f"Key points:\n{key_points}\n"
+            f"Summary: {summary.summary}"
+        )
+
+    @classmethod
+    def _summary_size(cls, summary: ChunkSummary) -> int:
+        return len(cls._format_summary(summary))
+
+    async def _merge_summaries(self, summaries: List[ChunkSummary]) -> ChunkSummary:
+        """Merge a group of consecutive summaries into one summary"""
+        combined_summaries = "\n\n".join(
+            self._format_summary(summary) for summary in summaries
+        )
+        prompt = f"""Synthesize these separate summaries of consecutive document sections into one coherent summary:
+
+        Individual summaries:
+        {combined_summaries}
+
+        Create a comprehensive yet concise summary that:
+        1) Captures the overarching themes
+        2) Maintains logical flow
+        3) Includes key insights from all sections
+
+        Provide your analysis in a structured format that includes:
+        - A list of main topics
+        - A list of key points
+        - A synthesized summary
+        """
+
+        response = await self._cached_structured_output(
+            ChunkSummary, MERGE_SUMMARY_PROMPT_VERSION, combined_summaries, prompt
+        )
         return response
 
     async def _classify_document(
@@ -88,43 +162,57 @@ class DocumentSummarizer:
         - A detailed explanation of why this category was chosen
         """
 
-        response = await self.llm.with_structured_output(
-            DocumentClassification
-        ).ainvoke(prompt)
+        response = await self._cached_structured_output(
+            DocumentClassification,
+            CLASSIFICATION_PROMPT_VERSION,
+            f"{categories_str}\n{full_summary}",
+            prompt,
+        )
         return response
 
     async def analyze_document(
-        self, file_path: Union[str, Path], categories: List[str]
+        self,
+        file_path: Union[str, Path],
+        categories: List[str],
+        parsed: Optional[ParsedDocument] = None,
+        on_progress: Optional[Callable[[MapReduceProgress], None]] = None,
     ) -> Union[DocumentSummary, Dict[str, str]]:
-        """Analyze document to provide summary and classification"""
+        """Analyze document to provide summary and classification
+
+        Args:
+            file_path: Path to the document
+            categories: Categories the document can be classified into
+            parsed: Already parsed document, parsed here when not provided
+            on_progress: Optional callback receiving summarization progress
+        """
         try:
             # Extract text from document
-            text = await self.parser.extract_text_async(file_path)
-
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(text)
-
-            # Generate summaries for each chunk
-            chunk_summaries: List[ChunkSummary] = []
-            for chunk in chunks:
-                summary = await self._generate_chunk_summary(chunk)
-                chunk_summaries.append(summary)
-
-            # Combine chunk summaries into a full summary
-            combined_summaries = "\n".join(cs.summary for cs in chunk_summaries)
-            combined_summary_prompt = f"""Synthesize these separate summaries into one coherent summary:
-
-            Individual summaries:
-            {combined_summaries}
-
-            Create a comprehensive yet concise summary that:
-            1) Captures the overarching themes
-            2) Maintains logical flow
-            3) Includes key insights from all chunks
-            """
+            if parsed is None:
+                parsed = await self.parser.parse_document_async(file_path)
+
+            chunks = [chunk.text for chunk in parsed.chunks["summary"]]
+            if not chunks:
+                # Nothing to reduce, a document without text gets an empty summary
+                return DocumentSummary(
+                    document_title=Path(file_path).name,
+                    chunk_summaries=[],
+                    full_summary="",
+                    classification=DocumentClassification(
+                        category="",
+                        confidence=0,
+                        explanation="The document has no text to classify",
+                    ),
+                    available_categories=categories,
+                )
+
+            # Generate summaries for all chunks concurrently
+            chunk_summaries: List[ChunkSummary] = await self.map_reduce.map(
+                chunks, on_progress
+            )
 
-            full_summary_response = await self.llm.ainvoke(combined_summary_prompt)
-            full_summary = full_summary_response.content
+            # Merge the summaries in bounded groups until one remains
+            root_summary = await self.map_reduce.reduce(chunk_summaries, on_progress)
+            full_summary = root_summary.summary
 
             # Classify the document
             classification = await self._classify_document(full_summary, categories)
@@ -144,6 +232,19 @@ class DocumentSummarizer:
             logger.error(f"Error analyzing document: {str(e)}")
             return {"error": f"Error analyzing document: {str(e)}"}
 
+    def astream_document(
+        self,
+        file_path: Union[str, Path],
+        categories: List[str],
+        parsed: Optional[ParsedDocument] = None,
+    ) -> AsyncIterator[Union[MapReduceProgress, DocumentSummary, Dict[str, str]]]:
+        """Analyze a document, yielding progress updates and then the result"""
+        return stream_progress(
+            lambda on_progress: self.analyze_document(
+                file_path, categories, parsed, on_progress
+            )
+        )
+
     def analyze_document_sync(
         self, file_path: Union[str, Path]
     ) -> Union[DocumentSummary, Dict[str, str]]:
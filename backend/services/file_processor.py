@@ -4,9 +4,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 from pathlib import Path
 from utils.parser import UnstructuredParser
+from models.parser_models import ParsedDocument
 from services.indexer import Indexer
 
 logger = logging.getLogger(__name__)
@@ -19,19 +20,35 @@ class FileProcessor:
         self.parser = UnstructuredParser()
         self.indexer = Indexer(collection_name="documents")
 
-    async def process_file(self, file_path: str) -> Dict:
-        """Process and index a file"""
+    async def process_file(
+        self,
+        file_path: str,
+        user_id: str,
+        file_id: str,
+        parsed: Optional[ParsedDocument] = None,
+    ) -> Dict:
+        """Process and index a file
+
+        Args:
+            file_path: Path to the file
+            user_id: Owner of the file, only their searches will see its chunks
+            file_id: Id of the file row
+            parsed: Already parsed document, parsed here when not provided
+        """
         try:
             # Extract text using Unstructured
-            text = await self.parser.extract_text_async(file_path)
+            if parsed is None:
+                parsed = await self.parser.parse_document_async(file_path)
 
             # Index the content
             metadata = {
                 "filename": Path(file_path).name,
                 "file_path": file_path,
+                "user_id": user_id,
+                "file_id": file_id,
             }
 
-            await self.indexer.index_document(text, metadata)
+            await self.indexer.index_chunks(parsed.chunks["index"], metadata)
 
             return {
                 "status": "success",
@@ -46,4 +63,4 @@ class FileProcessor:
 if __name__ == "__main__":
     import asyncio
 
-    asyncio.run(FileProcessor().process_file("test.pdf"))
+    asyncio.run(FileProcessor().process_file("test.pdf", "test_user", "test_file"))
@@ -0,0 +1,198 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import logging
+import time
+from typing import List
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    CollectionStatus,
+    Disabled,
+    Filter,
+    HasIdCondition,
+    IsEmptyCondition,
+    PayloadField,
+    QueryRequest,
+    ScalarQuantization,
+    VectorParamsDiff,
+)
+from models.indexer_models import RecallReport, SearchFilter, StorageProfile
+from services.qdrant_backend import STORAGE_PROFILES, qdrant_filter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def current_profile(client: QdrantClient, collection_name: str) -> StorageProfile:
+    """Return the storage profile matching a collection's quantization"""
+    quantization = client.get_collection(collection_name).config.quantization_config
+    if isinstance(quantization, ScalarQuantization):
+        return STORAGE_PROFILES["int8"]
+    if isinstance(quantization, BinaryQuantization):
+        return STORAGE_PROFILES["binary"]
+    return STORAGE_PROFILES["default"]
+
+
+def estimate_vector_ram(
+    client: QdrantClient, collection_name: str, profile: StorageProfile
+) -> int:
+    """Estimate the bytes of RAM the dense vectors need under a profile"""
+    info = client.get_collection(collection_name)
+    dimension = info.config.params.vectors.size
+    return int((info.points_count or 0) * dimension * profile.bytes_per_dimension)
+
+
+def measure_recall(
+    client: QdrantClient,
+    collection_name: str,
+    profile: StorageProfile,
+    samples: int = 100,
+    k: int = 10,
+    batch_size: int = 16,
+) -> RecallReport:
+    """Measure recall@k of the profile's search against an exact search
+
+    Stored vectors are used as queries, each filtered to its owner's chunks the
+    way real searches are, and never match themselves. Point IDs are content
+    hashes, so the first points of a scroll are an unbiased sample. Chunks
+    indexed before they had an owner are not sampled.
+    """
+    points, _ = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=Filter(
+            must_not=[IsEmptyCondition(is_empty=PayloadField(key="metadata.user_id"))]
+        ),
+        limit=samples,
+        with_payload=["metadata.user_id"],
+        with_vectors=True,
+    )
+
+    recalls: List[float] = []
+    for start in range(0, len(points), batch_size):
+        requests = []
+        for point in points[start : start + batch_size]:
+            vector = point.vector
+            if isinstance(vector, dict):
+                vector = vector[""]
+            query_filter = qdrant_filter(
+                SearchFilter(user_id=point.payload["metadata"]["user_id"])
+            )
+            query_filter.must_not = [HasIdCondition(has_id=[point.id])]
+            for exact in (False, True):
+                requests.append(
+                    QueryRequest(
+                        query=vector,
+                        filter=query_filter,
+                        params=profile.search_params(exact=exact),
+                        limit=k,
+                    )
+                )
+
+        responses = client.query_batch_points(
+            collection_name=collection_name, requests=requests
+        )
+        for approximate, exact in zip(responses[::2], responses[1::2]):
+            expected = {point.id for point in exact.points}
+            if expected:
+                found = {point.id for point in approximate.points}
+                recalls.append(len(found & expected) / len(expected))
+
+    return RecallReport(
+        profile=profile.name,
+        samples=len(recalls),
+        k=k,
+        recall=sum(recalls) / len(recalls) if recalls else 1.0,
+    )
+
+
+def apply_profile(
+    client: QdrantClient,
+    collection_name: str,
+    profile: StorageProfile,
+    timeout: float = 3600,
+    poll_interval: float = 5,
+) -> None:
+    """Convert a collection to a profile and wait until Qdrant has rebuilt it"""
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=profile.on_disk)},
+        quantization_config=profile.quantization or Disabled.DISABLED,
+    )
+
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection_name).status != CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(
+                f"Collection {collection_name} was not optimized within {timeout}s"
+            )
+        time.sleep(poll_interval)
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Convert the documents collection to another storage profile"
+    )
+    parser.add_argument("profile", choices=sorted(STORAGE_PROFILES))
+    parser.add_argument("--collection", default="documents")
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="Largest allowed drop in recall@k compared to before the migration",
+    )
+    parser.add_argument("--timeout", type=float, default=3600)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only measure the current recall"
+    )
+    args = parser.parse_args()
+
+    client = QdrantClient(url=os.getenv("QDRANT_URL"))
+    source = current_profile(client, args.collection)
+    target = STORAGE_PROFILES[args.profile]
+
+    before = measure_recall(client, args.collection, source, args.samples, args.k)
+    logger.info(
+        f"{source.name}: recall@{before.k} {before.recall:.4f} over "
+        f"{before.samples} queries, about "
+        f"{estimate_vector_ram(client, args.collection, source) / 2**20:.1f} MB "
+        "of vectors in RAM"
+    )
+    if args.dry_run:
+        return 0
+
+    logger.info(f"Converting {args.collection} to the {target.name} profile")
+    apply_profile(client, args.collection, target, timeout=args.timeout)
+
+    after = measure_recall(client, args.collection, target, args.samples, args.k)
+    logger.info(
+        f"{target.name}: recall@{after.k} {after.recall:.4f} over "
+        f"{after.samples} queries, about "
+        f"{estimate_vector_ram(client, args.collection, target) / 2**20:.1f} MB "
+        "of vectors in RAM"
+    )
+
+    if before.recall - after.recall > args.tolerance:
+        logger.error(
+            f"Recall dropped by {before.recall - after.recall:.4f}, more than the "
+            f"tolerance of {args.tolerance}. Revert with: "
+            f"python -m services.index_migration {source.name}"
+        )
+        return 1
+
+    logger.info(f"Set QDRANT_STORAGE_PROFILE={target.name} for new collections")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
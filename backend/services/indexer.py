@@ -1,16 +1,21 @@
 import sys
 import os
+import asyncio
 import hashlib
 import json
+from functools import partial
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from qdrant_client import QdrantClient
+from models.indexer_models import ScoredChunk, SearchFilter
+from models.parser_models import Chunk
+from services.vector_backend import VectorBackend, get_vector_backend
 from utils.embedder import Embedder
-from langchain_qdrant import QdrantVectorStore
+from utils.rank_fusion import reciprocal_rank_fusion
+from utils.reranker import Reranker
+from utils.sparse_encoder import SparseEncoder
 import logging
 from langchain_core.tools import Tool
 
@@ -19,12 +24,39 @@ logger = logging.getLogger(__name__)
 
 
 class Indexer:
-    """Simple document indexer using Qdrant"""
+    """Simple document indexer on a pluggable vector backend
 
-    def __init__(self, collection_name: str = "documents"):
+    All users share one collection. Every chunk carries its user_id, file_id and
+    category_id in the metadata, and every search is filtered by user_id, so
+    search cost grows with the user's own corpus instead of the whole collection.
+
+    Chunks are stored with a dense embedding and a BM25 sparse vector. Searches
+    run both retrievals and fuse them with reciprocal rank fusion, so exact terms
+    such as part numbers and names are found even when the embedding misses them.
+    With RERANK_ENABLED, the fused candidates are re-ordered by a cross-encoder
+    before the top results are returned.
+
+    VECTOR_BACKEND selects where chunks are stored: a Qdrant server (qdrant, the
+    default) or an in-process index (local), see services.vector_backend.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "documents",
+        batch_size: int = None,
+        candidates: int = None,
+        backend: Optional[VectorBackend] = None,
+    ):
         self.collection_name = collection_name
-        self.client = QdrantClient(url=os.getenv("QDRANT_URL"))
+        self.batch_size = batch_size or int(os.getenv("INDEX_BATCH_SIZE", "64"))
+        # Results fetched from each retriever before fusion
+        self.candidates = candidates or int(os.getenv("SEARCH_CANDIDATES", "20"))
         self.embedder = Embedder()
+        self.sparse_encoder = SparseEncoder()
+        self.reranker = Reranker()
+        self.backend = backend or get_vector_backend(
+            collection_name, self.embedder.get_sentence_embedding_dimension()
+        )
 
         # Initialize text splitter
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -32,83 +64,204 @@ class Indexer:
             chunk_overlap=200,
             length_function=len,
         )
-        self.vector_store = QdrantVectorStore(
-            client=self.client,
-            collection_name=self.collection_name,
-            embedding=self.embedder,
+
+    @staticmethod
+    def generate_id(content: str, metadata: Dict) -> int:
+        """Generate a deterministic point ID from a chunk and its metadata"""
+        combined = f"{content}{json.dumps(metadata, sort_keys=True)}"
+        return int(hashlib.sha256(combined.encode()).hexdigest()[:16], 16)
+
+    def _index_batch(self, chunks: Dict[int, Tuple[str, Dict]]) -> int:
+        """Embed and upsert the chunks of one batch that are not indexed yet
+
+        Args:
+            chunks: (text, metadata) of each chunk by point ID
+        """
+        existing = self.backend.existing_ids(list(chunks))
+        new_chunks = {
+            point_id: chunk
+            for point_id, chunk in chunks.items()
+            if point_id not in existing
+        }
+        if not new_chunks:
+            return 0
+
+        texts = [text for text, _ in new_chunks.values()]
+        sparse_vectors = (
+            self.sparse_encoder.encode_documents(texts) if self.backend.hybrid else None
+        )
+        # Payload layout matches langchain_qdrant's QdrantVectorStore
+        self.backend.upsert(
+            ids=list(new_chunks),
+            vectors=self.embedder.embed_documents(texts),
+            sparse_vectors=sparse_vectors,
+            payloads=[
+                {"page_content": text, "metadata": metadata}
+                for text, metadata in new_chunks.values()
+            ],
         )
-        # Ensure collection exists
-        self._create_collection()
+        return len(new_chunks)
 
-    def _create_collection(self):
-        """Create Qdrant collection if it doesn't exist"""
-        try:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config={
-                    "size": self.embedder.get_sentence_embedding_dimension(),
-                    "distance": "Cosine",
-                },
-            )
-        except Exception as e:
-            logger.info(f"Collection may already exist: {e}")
+    async def _index_points(self, chunks: List[Tuple[str, Dict]], metadata: Dict):
+        """Index (text, metadata) chunks in batches under content-derived IDs"""
+        # Chunks repeated within the document collapse onto one ID
+        points = {self.generate_id(text, meta): (text, meta) for text, meta in chunks}
+        point_ids = list(points)
+
+        indexed = 0
+        for start in range(0, len(point_ids), self.batch_size):
+            batch = {
+                point_id: points[point_id]
+                for point_id in point_ids[start : start + self.batch_size]
+            }
+            # Embedding and the backend calls block, so keep them off the loop
+            indexed += await asyncio.to_thread(self._index_batch, batch)
+
+        logger.info(
+            f"Indexed {indexed} new of {len(point_ids)} chunks "
+            f"for {metadata.get('filename')}"
+        )
 
     async def index_document(self, text: str, metadata: Dict) -> None:
-        """Index a document's text with metadata"""
+        """Index a document's text with metadata
+
+        Chunks are embedded once, in batches, and upserted under IDs derived from
+        their content and metadata, so re-indexing a file skips chunks that are
+        already stored instead of duplicating them.
+        """
         try:
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(text)
-
-            # Create documents with metadata
-            documents = [
-                Document(page_content=chunk, metadata=metadata) for chunk in chunks
-            ]
-            # Get embeddings
-            embeddings = self.embedder.embed_documents(
-                [d.page_content for d in documents]
+            await self._index_points(
+                [(chunk, metadata) for chunk in self.text_splitter.split_text(text)],
+                metadata,
             )
-            print(len(documents))
-            print(len(embeddings))
-
-            # Generate unique IDs using hash of content and metadata
-            def generate_id(content: str, metadata: Dict) -> int:
-                combined = f"{content}{json.dumps(metadata, sort_keys=True)}"
-                return int(hashlib.sha256(combined.encode()).hexdigest()[:16], 16)
+        except Exception as e:
+            logger.error(f"Error indexing document: {e}")
+            raise
 
-            # Upload to Qdrant
-            self.vector_store.add_documents(documents)
+    async def index_chunks(self, chunks: List[Chunk], metadata: Dict) -> None:
+        """Index chunks built from the document structure, see utils.chunker
 
+        Each chunk's pages and section are added to its metadata, so search
+        results can cite where in the document they come from.
+        """
+        try:
+            await self._index_points(
+                [
+                    (
+                        chunk.text,
+                        {**metadata, "pages": chunk.pages, "section": chunk.section},
+                    )
+                    for chunk in chunks
+                ],
+                metadata,
+            )
         except Exception as e:
             logger.error(f"Error indexing document: {e}")
             raise
 
-    def search(self, query: str, limit: int = 3) -> List[Dict]:
-        """Search for relevant document chunks"""
+    async def set_category(self, file_id: str, category_id: Optional[str]) -> None:
+        """Tag every chunk of a file with the category it was classified into"""
+        await self.backend.aset_payload(file_id, {"category_id": category_id})
+
+    def _fetch_limit(self, limit: int) -> int:
+        """Number of fused results to keep, over-fetching for the reranker"""
+        if self.reranker.enabled:
+            return max(limit, self.reranker.candidates)
+        return limit
+
+    def _search_args(
+        self,
+        query: str,
+        query_vector: List[float],
+        fetch_limit: int,
+        user_id: str,
+        file_ids: Optional[Iterable[str]],
+        category_id: Optional[str],
+    ) -> tuple:
+        """Arguments of the backend search for one query"""
+        hybrid = self.backend.hybrid
+        return (
+            query_vector,
+            self.sparse_encoder.encode_query(query) if hybrid else None,
+            SearchFilter(
+                user_id=user_id,
+                file_ids=list(file_ids) if file_ids else None,
+                category_id=category_id,
+            ),
+            max(fetch_limit, self.candidates) if hybrid else fetch_limit,
+        )
+
+    @staticmethod
+    def _fuse(rankings: List[List[ScoredChunk]], limit: int) -> List[Dict]:
+        """Fuse the rankings of each retriever into search results"""
+        chunks: List[ScoredChunk] = reciprocal_rank_fusion(
+            rankings, key=lambda chunk: chunk.id, limit=limit
+        )
+        return [
+            {
+                "content": chunk.payload.get("page_content"),
+                "metadata": chunk.payload.get("metadata", {}),
+            }
+            for chunk in chunks
+        ]
+
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        limit: int = 3,
+        file_ids: Optional[Iterable[str]] = None,
+        category_id: Optional[str] = None,
+    ) -> List[Dict]:
+        """Search a user's document chunks, optionally within files or a category"""
         try:
             query_vector = self.embedder.embed_query(query)
-
-            results = self.vector_store.similarity_search(
-                query=query,
-                k=limit,
+            fetch_limit = self._fetch_limit(limit)
+            rankings = self.backend.search(
+                *self._search_args(
+                    query, query_vector, fetch_limit, user_id, file_ids, category_id
+                )
             )
-            # print(results)
+            results = self._fuse(rankings, fetch_limit)
+            return self.reranker.rerank(query, results, limit)
 
-            return [
-                {
-                    "content": r.page_content,
-                    "metadata": r.metadata,
-                }
-                for r in results
-            ]
+        except Exception as e:
+            logger.error(f"Error searching documents: {e}")
+            raise
+
+    async def aembed_queries(self, queries: List[str]) -> None:
+        """Embed queries in one batch so later searches for them hit the cache"""
+        await asyncio.to_thread(self.embedder.embed_documents, queries)
+
+    async def asearch(
+        self,
+        query: str,
+        user_id: str,
+        limit: int = 3,
+        file_ids: Optional[Iterable[str]] = None,
+        category_id: Optional[str] = None,
+    ) -> List[Dict]:
+        """Search a user's document chunks without blocking the event loop"""
+        try:
+            query_vector = await asyncio.to_thread(self.embedder.embed_query, query)
+            fetch_limit = self._fetch_limit(limit)
+            rankings = await self.backend.asearch(
+                *self._search_args(
+                    query, query_vector, fetch_limit, user_id, file_ids, category_id
+                )
+            )
+            results = self._fuse(rankings, fetch_limit)
+            return await self.reranker.arerank(query, results, limit)
 
         except Exception as e:
             logger.error(f"Error searching documents: {e}")
             raise
 
-    def as_tool(self) -> Tool:
-        """Convert the indexer into a LangChain tool."""
+    def as_tool(self, user_id: str) -> Tool:
+        """Convert the indexer into a LangChain tool searching one user's documents"""
         return Tool(
             name="document_search",
             description="Search through indexed documents for relevant information. Input should be a search query string.",
-            func=self.search,
+            func=partial(self.search, user_id=user_id),
+            coroutine=partial(self.asearch, user_id=user_id),
         )
@@ -0,0 +1,420 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from config.database import SessionLocal
+from models.database_models import Job, JobStatus
+from models.job_models import JobInfo
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobConflictError(Exception):
+    """Raised when a file already has a queued or running job"""
+
+
+class JobQueue(ABC):
+    """Background job queue with retries and per-user fairness
+
+    Handlers are registered by job kind. Workers claim the oldest runnable job of
+    the user with the fewest running jobs, so one user's bulk upload cannot starve
+    everyone else. Failed jobs are retried with exponential backoff.
+    """
+
+    def __init__(self, retry_delay: float = 30.0, poll_interval: float = 1.0):
+        """Initialize the queue
+
+        Args:
+            retry_delay: Delay in seconds before the first retry, doubled per attempt
+            poll_interval: Seconds an idle worker waits before looking for jobs again
+        """
+        self.handlers: Dict[str, JobHandler] = {}
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._stopping = False
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Register the coroutine function that runs jobs of a kind"""
+        self.handlers[kind] = handler
+
+    def _next_run_at(self, attempts: int) -> datetime:
+        return datetime.utcnow() + timedelta(
+            seconds=self.retry_delay * 2 ** (attempts - 1)
+        )
+
+    @abstractmethod
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: str,
+        file_id: Optional[str] = None,
+        max_attempts: int = 3,
+    ) -> str:
+        """Add a job to the queue and return its id
+
+        Raises:
+            JobConflictError: If the file already has a queued or running job
+        """
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[JobInfo]:
+        """Return a job by id"""
+
+    @abstractmethod
+    async def get_file_job(self, file_id: str) -> Optional[JobInfo]:
+        """Return the most recent job for a file"""
+
+    @abstractmethod
+    async def _claim(self) -> Optional[JobInfo]:
+        """Mark the next runnable job as running and return it"""
+
+    @abstractmethod
+    async def _finish(self, job: JobInfo, error: Optional[str]) -> None:
+        """Record the outcome of a job attempt, scheduling a retry on failure"""
+
+    async def start(self) -> None:
+        """Start in-process workers, if the backend runs any"""
+
+    async def stop(self) -> None:
+        """Stop in-process workers, if the backend runs any"""
+        self._stopping = True
+
+    async def _run_job(self, job: JobInfo) -> None:
+        handler = self.handlers.get(job.kind)
+        error = None
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind {job.kind}")
+            await handler(job.payload)
+        except Exception as e:
+            logger.error(f"Job {job.id} attempt {job.attempts} failed: {e}")
+            error = f"{type(e).__name__}: {e}"
+        await self._finish(job, error)
+
+    async def run_worker(self, concurrency: int = 1) -> None:
+        """Claim and run jobs until stopped, with up to `concurrency` at a time"""
+        slots = asyncio.Semaphore(concurrency)
+        running = set()
+        self._stopping = False
+
+        while not self._stopping:
+            await slots.acquire()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                slots.release()
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            logger.info(f"Running job {job.id} ({job.kind}), attempt {job.attempts}")
+            task = asyncio.create_task(self._run_job(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+class PostgresJobQueue(JobQueue):
+    """Durable job queue stored in the jobs table and claimed with SKIP LOCKED
+
+    Jobs survive API and worker restarts. A running job whose worker disappears
+    is handed out again once it has been locked for longer than `lock_timeout`.
+    """
+
+    def __init__(self, lock_timeout: float = 3600.0, **kwargs):
+        """Initialize the queue
+
+        Args:
+            lock_timeout: Seconds after which a running job is considered abandoned
+        """
+        super().__init__(**kwargs)
+        self.lock_timeout = lock_timeout
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: str,
+        file_id: Optional[str] = None,
+        max_attempts: int = 3,
+    ) -> str:
+        def insert() -> str:
+            with SessionLocal() as db:
+                job = Job(
+                    kind=kind,
+                    payload=payload,
+                    user_id=user_id,
+                    file_id=file_id,
+                    max_attempts=max_attempts,
+                )
+                db.add(job)
+                try:
+                    db.commit()
+                except IntegrityError as e:
+                    if "ux_jobs_active_file_id" in str(e.orig):
+                        raise JobConflictError(
+                            f"File {file_id} already has an active job"
+                        ) from e
+                    raise
+                return job.id
+
+        return await asyncio.to_thread(insert)
+
+    async def get_job(self, job_id: str) -> Optional[JobInfo]:
+        def fetch() -> Optional[JobInfo]:
+            with SessionLocal() as db:
+                job = db.get(Job, job_id)
+                return JobInfo.model_validate(job) if job else None
+
+        return await asyncio.to_thread(fetch)
+
+    async def get_file_job(self, file_id: str) -> Optional[JobInfo]:
+        def fetch() -> Optional[JobInfo]:
+            with SessionLocal() as db:
+                job = db.scalars(
+                    select(Job)
+                    .where(Job.file_id == file_id)
+                    .order_by(Job.created_at.desc())
+                    .limit(1)
+                ).first()
+                return JobInfo.model_validate(job) if job else None
+
+        return await asyncio.to_thread(fetch)
+
+    def _release_abandoned(self, db) -> None:
+        """Requeue running jobs whose worker stopped without finishing them"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lock_timeout)
+        abandoned = (Job.status == JobStatus.RUNNING.value, Job.locked_at < cutoff)
+        db.execute(
+            update(Job)
+            .where(*abandoned, Job.attempts < Job.max_attempts)
+            .values(status=JobStatus.QUEUED.value, locked_at=None)
+        )
+        db.execute(
+            update(Job)
+            .where(*abandoned, Job.attempts >= Job.max_attempts)
+            .values(
+                status=JobStatus.FAILED.value,
+                locked_at=None,
+                error="Worker stopped before the job finished",
+            )
+        )
+
+    async def _claim(self) -> Optional[JobInfo]:
+        def claim() -> Optional[JobInfo]:
+            with SessionLocal() as db:
+                self._release_abandoned(db)
+
+                # Users with fewer running jobs go first, then oldest job first
+                running_job = aliased(Job)
+                running_count = (
+                    select(func.count())
+                    .select_from(running_job)
+                    .where(
+                        running_job.user_id == Job.user_id,
+                        running_job.status == JobStatus.RUNNING.value,
+                    )
+                    .correlate(Job)
+                    .scalar_subquery()
+                )
+                job = db.scalars(
+                    select(Job)
+                    .where(
+                        Job.status == JobStatus.QUEUED.value,
+                        Job.run_at <= datetime.utcnow(),
+                    )
+                    .order_by(running_count, Job.created_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True, of=Job)
+                ).first()
+                if job is None:
+                    db.commit()
+                    return None
+
+                job.status = JobStatus.RUNNING.value
+                job.attempts += 1
+                job.locked_at = datetime.utcnow()
+                db.commit()
+                return JobInfo.model_validate(job)
+
+        return await asyncio.to_thread(claim)
+
+    async def _finish(self, job: JobInfo, error: Optional[str]) -> None:
+        def finish() -> None:
+            with SessionLocal() as db:
+                db_job = db.get(Job, job.id)
+                if db_job is None:
+                    # The file and its jobs were deleted while the job ran
+                    return
+                db_job.locked_at = None
+                db_job.error = error
+                if error is None:
+                    db_job.status = JobStatus.SUCCEEDED.value
+                elif db_job.attempts < db_job.max_attempts:
+                    db_job.status = JobStatus.QUEUED.value
+                    db_job.run_at = self._next_run_at(db_job.attempts)
+                else:
+                    db_job.status = JobStatus.FAILED.value
+                db.commit()
+
+        await asyncio.to_thread(finish)
+
+
+class InMemoryJobQueue(JobQueue):
+    """Job queue kept in process memory and run by in-process workers
+
+    Jobs are lost on restart, so this backend is meant for tests and local runs
+    without Postgres.
+    """
+
+    def __init__(self, workers: int = 1, **kwargs):
+        """Initialize the queue
+
+        Args:
+            workers: Number of jobs run concurrently by the in-process worker
+        """
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.pending: Dict[str, Deque[str]] = {}
+        self._worker_task: Optional[asyncio.Task] = None
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: str,
+        file_id: Optional[str] = None,
+        max_attempts: int = 3,
+    ) -> str:
+        # Checked and added without awaiting in between, so it is atomic
+        if file_id is not None and any(
+            job["file_id"] == file_id
+            and job["status"] in (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+            for job in self.jobs.values()
+        ):
+            raise JobConflictError(f"File {file_id} already has an active job")
+
+        now = datetime.utcnow()
+        job_id = str(uuid.uuid4())
+        self.jobs[job_id] = {
+            "id": job_id,
+            "kind": kind,
+            "payload": payload,
+            "status": JobStatus.QUEUED.value,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "error": None,
+            "file_id": file_id,
+            "user_id": user_id,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.pending.setdefault(user_id, deque()).append(job_id)
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[JobInfo]:
+        job = self.jobs.get(job_id)
+        return JobInfo(**job) if job else None
+
+    async def get_file_job(self, file_id: str) -> Optional[JobInfo]:
+        jobs = [job for job in self.jobs.values() if job["file_id"] == file_id]
+        if not jobs:
+            return None
+        return JobInfo(**max(jobs, key=lambda job: job["created_at"]))
+
+    def _running_count(self, user_id: str) -> int:
+        return sum(
+            1
+            for job in self.jobs.values()
+            if job["user_id"] == user_id and job["status"] == JobStatus.RUNNING.value
+        )
+
+    async def _claim(self) -> Optional[JobInfo]:
+        now = datetime.utcnow()
+        candidates: List[Dict[str, Any]] = []
+        for user_id, job_ids in self.pending.items():
+            runnable = [
+                self.jobs[job_id]
+                for job_id in job_ids
+                if self.jobs[job_id]["run_at"] <= now
+            ]
+            if runnable:
+                candidates.append(min(runnable, key=lambda job: job["created_at"]))
+        if not candidates:
+            return None
+
+        job = min(
+            candidates,
+            key=lambda job: (self._running_count(job["user_id"]), job["created_at"]),
+        )
+        self.pending[job["user_id"]].remove(job["id"])
+        job["status"] = JobStatus.RUNNING.value
+        job["attempts"] += 1
+        job["updated_at"] = now
+        return JobInfo(**job)
+
+    async def _finish(self, job: JobInfo, error: Optional[str]) -> None:
+        stored = self.jobs[job.id]
+        stored["error"] = error
+        stored["updated_at"] = datetime.utcnow()
+        if error is None:
+            stored["status"] = JobStatus.SUCCEEDED.value
+        elif stored["attempts"] < stored["max_attempts"]:
+            stored["status"] = JobStatus.QUEUED.value
+            stored["run_at"] = self._next_run_at(stored["attempts"])
+            self.pending[stored["user_id"]].append(job.id)
+        else:
+            stored["status"] = JobStatus.FAILED.value
+
+    async def start(self) -> None:
+        if self._worker_task is None:
+            self._worker_task = asyncio.create_task(self.run_worker(self.workers))
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self._worker_task is not None:
+            await self._worker_task
+            self._worker_task = None
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue selected by JOB_QUEUE_BACKEND"""
+    global _job_queue
+    if _job_queue is None:
+        backend = os.getenv("JOB_QUEUE_BACKEND", "postgres")
+        if backend == "memory":
+            _job_queue = InMemoryJobQueue(
+                workers=int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+            )
+        elif backend == "postgres":
+            _job_queue = PostgresJobQueue()
+        else:
+            raise ValueError(f"Unsupported job queue backend: {backend}")
+    return _job_queue
@@ -0,0 +1,409 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atexit
+import fcntl
+import json
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+import numpy as np
+from qdrant_client.models import SparseVector
+from models.indexer_models import ScoredChunk, SearchFilter
+from services.vector_backend import VectorBackend
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend(VectorBackend):
+    """Chunks stored on local disk, for tests and single-node installs
+
+    Dense vectors are normalized and kept in a memory-mapped float32 file, so the
+    OS pages them in and out instead of holding the corpus in RAM. Payloads and
+    sparse vectors go to an append-only log that is replayed on start-up. Rows
+    are grouped per user, like Qdrant's tenant index. A search only touches the
+    rows of its user. Dense search is a NumPy brute-force scan, unless the rows
+    to search reach `hnsw_threshold` and hnswlib is installed, then an HNSW graph
+    is used. The BM25 retrieval uses a per-user inverted index with the same IDF
+    formula as Qdrant's IDF modifier.
+
+    The API and the job workers can share an index on one host. Writes hold an
+    exclusive lock on the index directory, and every process applies the log
+    records of the others before it reads or writes.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        dimension: int,
+        path: Optional[str] = None,
+        hnsw_threshold: Optional[int] = None,
+    ):
+        """Open the index, creating its files on first use
+
+        Args:
+            collection_name: Name of the index, the directory under `path`
+            dimension: Size of the dense vectors
+            path: Directory of all local indexes. Defaults to the
+                LOCAL_INDEX_DIR env variable or '.cache/vector_index'
+            hnsw_threshold: Rows to search from which the HNSW graph is used.
+                Defaults to LOCAL_INDEX_HNSW_THRESHOLD or 50000
+        """
+        self.dimension = dimension
+        self.directory = os.path.join(
+            path or os.getenv("LOCAL_INDEX_DIR", ".cache/vector_index"),
+            collection_name,
+        )
+        self.hnsw_threshold = hnsw_threshold or int(
+            os.getenv("LOCAL_INDEX_HNSW_THRESHOLD", "50000")
+        )
+        self.hybrid = True
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._log_path = os.path.join(self.directory, "rows.jsonl")
+        self._hnsw_path = os.path.join(self.directory, "hnsw.bin")
+
+        self._lock = threading.RLock()
+        self.ids: List[int] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.rows: Dict[int, int] = {}
+        self.user_rows: Dict[str, List[int]] = defaultdict(list)
+        self.file_rows: Dict[str, List[int]] = defaultdict(list)
+        # user id -> token id -> {row: BM25 term frequency weight}
+        self.postings: Dict[str, Dict[int, Dict[int, float]]] = defaultdict(
+            lambda: defaultdict(dict)
+        )
+        # token id -> rows holding it in the whole collection, for the IDF
+        self.token_rows: Counter = Counter()
+        self._hnsw = None
+        self._hnsw_dirty = False
+
+        # Log bytes applied to the rows above
+        self._log_offset = 0
+        self._capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self._log = open(self._log_path, "ab")
+        self._lock_file = open(os.path.join(self.directory, "lock"), "a")
+        with self._locked(exclusive=True):
+            self._grow_vectors(max(len(self.ids), 1024))
+        atexit.register(self.close)
+        logger.info(
+            f"Opened local vector index {self.directory} ({len(self.ids)} rows)"
+        )
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False) -> Iterator[None]:
+        """Lock the index against other threads and processes and catch up
+
+        Searches share the lock, writes hold it alone.
+        """
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _map_vectors(self) -> None:
+        """Map the whole vector file, it is only grown under the exclusive lock"""
+        capacity = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+        if capacity != self._capacity:
+            self.vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r+",
+                shape=(capacity, self.dimension),
+            )
+            self._capacity = capacity
+
+    def _grow_vectors(self, capacity: int) -> None:
+        """Grow the vector file to hold `capacity` rows"""
+        size = capacity * self.dimension * 4
+        if not os.path.exists(self._vectors_path):
+            open(self._vectors_path, "wb").close()
+        if os.path.getsize(self._vectors_path) < size:
+            if self.vectors is not None:
+                self.vectors.flush()
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(size)
+        self._map_vectors()
+
+    def _catch_up(self) -> None:
+        """Apply the log records written since the last call, by any process"""
+        if os.path.getsize(self._log_path) == self._log_offset:
+            return
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # A line is only applied once it is complete
+        end = data.rfind(b"\n") + 1
+        added = False
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a line half written
+                logger.warning(f"Skipping unreadable record in {self._log_path}")
+                continue
+            if record["op"] == "add":
+                self._add_row(record["id"], record["payload"], record["sparse"])
+                added = True
+            elif record["op"] == "set":
+                self._set_row_metadata(record["file_id"], record["metadata"])
+        self._log_offset += end
+        if added:
+            # Vectors are written before their log records, the file holds them
+            self._map_vectors()
+            self._hnsw_dirty = True
+
+    def _add_row(
+        self, point_id: int, payload: Dict[str, Any], sparse: Optional[List[list]]
+    ) -> int:
+        row = len(self.ids)
+        # Chunks of a file share one metadata dict, rows need their own
+        payload = {**payload, "metadata": dict(payload.get("metadata", {}))}
+        self.ids.append(point_id)
+        self.payloads.append(payload)
+        self.rows[point_id] = row
+        metadata = payload["metadata"]
+        self.user_rows[metadata.get("user_id")].append(row)
+        self.file_rows[metadata.get("file_id")].append(row)
+        if sparse:
+            postings = self.postings[metadata.get("user_id")]
+            for token_id, weight in zip(*sparse):
+                postings[token_id][row] = weight
+                self.token_rows[token_id] += 1
+        return row
+
+    def _set_row_metadata(self, file_id: str, metadata: Dict[str, Any]) -> None:
+        for row in self.file_rows.get(file_id, []):
+            self.payloads[row]["metadata"].update(metadata)
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        """Append records to the log, holding the exclusive lock"""
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        if os.path.getsize(self._log_path) > self._log_offset:
+            # End a line left half written by a crash, so it is skipped alone
+            data = "\n" + data
+        self._log.write(data.encode("utf-8"))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        # The records were applied when they were written
+        self._log_offset = self._log.tell()
+
+    def existing_ids(self, ids: List[int]) -> Set[int]:
+        with self._locked():
+            return {point_id for point_id in ids if point_id in self.rows}
+
+    def upsert(
+        self,
+        ids: List[int],
+        vectors: List[List[float]],
+        sparse_vectors: Optional[List[SparseVector]],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        """Store new chunks
+
+        Point ids are content hashes, so an id that is already stored holds the
+        same chunk and is left as it is.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        sparse_vectors = sparse_vectors or [None] * len(ids)
+
+        with self._locked(exclusive=True):
+            new = [
+                index for index, point_id in enumerate(ids) if point_id not in self.rows
+            ]
+            if not new:
+                return
+
+            needed = len(self.ids) + len(new)
+            if needed > self._capacity:
+                self._grow_vectors(max(needed, self._capacity * 2))
+
+            # Vectors are written before the log, a logged row always has one
+            start = len(self.ids)
+            self.vectors[start : start + len(new)] = matrix[new]
+            self.vectors.flush()
+
+            records = []
+            for index in new:
+                sparse = sparse_vectors[index]
+                sparse = [sparse.indices, sparse.values] if sparse is not None else None
+                self._add_row(ids[index], payloads[index], sparse)
+                records.append(
+                    {
+                        "op": "add",
+                        "id": ids[index],
+                        "payload": payloads[index],
+                        "sparse": sparse,
+                    }
+                )
+            self._write(records)
+            self._hnsw_dirty = True
+
+    def set_payload(self, file_id: str, metadata: Dict[str, Any]) -> None:
+        with self._locked(exclusive=True):
+            self._set_row_metadata(file_id, metadata)
+            self._write([{"op": "set", "file_id": file_id, "metadata": metadata}])
+
+    def _filter_rows(self, search_filter: SearchFilter) -> np.ndarray:
+        """Rows of the user's chunks that match the rest of the filter"""
+        rows = self.user_rows.get(search_filter.user_id, [])
+        if search_filter.file_ids:
+            file_ids = set(search_filter.file_ids)
+            rows = [
+                row
+                for row in rows
+                if self.payloads[row]["metadata"].get("file_id") in file_ids
+            ]
+        if search_filter.category_id:
+            rows = [
+                row
+                for row in rows
+                if self.payloads[row]["metadata"].get("category_id")
+                == search_filter.category_id
+            ]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _hnsw_index(self):
+        """Return the HNSW graph over all rows, bringing it up to date"""
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space="ip", dim=self.dimension)
+            if os.path.exists(self._hnsw_path):
+                self._hnsw.load_index(self._hnsw_path, max_elements=self._capacity)
+            else:
+                self._hnsw.init_index(
+                    max_elements=self._capacity, ef_construction=200, M=16
+                )
+            self._hnsw_dirty = True
+
+        if self._hnsw_dirty:
+            indexed = self._hnsw.get_current_count()
+            if indexed < len(self.ids):
+                if self._hnsw.get_max_elements() < self._capacity:
+                    self._hnsw.resize_index(self._capacity)
+                rows = np.arange(indexed, len(self.ids))
+                self._hnsw.add_items(self.vectors[rows], rows)
+            self._hnsw_dirty = False
+        return self._hnsw
+
+    def _dense_search(
+        self, query: np.ndarray, rows: np.ndarray, limit: int
+    ) -> List[tuple]:
+        if len(rows) >= self.hnsw_threshold and hnswlib is not None:
+            allowed = set(rows.tolist())
+            index = self._hnsw_index()
+            index.set_ef(max(limit * 2, 64))
+            # The Python filter needs a single search thread
+            index.set_num_threads(1)
+            try:
+                labels, distances = index.knn_query(
+                    query, k=limit, filter=lambda row: row in allowed
+                )
+                return [
+                    (int(row), 1 - float(distance))
+                    for row, distance in zip(labels[0], distances[0])
+                ]
+            except RuntimeError as e:
+                # Raised when the graph walk finds fewer than `limit` allowed rows
+                logger.warning(f"HNSW search failed, scanning instead: {e}")
+
+        scores = self.vectors[rows] @ query
+        if len(rows) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _sparse_search(
+        self,
+        sparse_vector: SparseVector,
+        user_id: str,
+        rows: np.ndarray,
+        limit: int,
+    ) -> List[tuple]:
+        allowed = set(rows.tolist())
+        total = len(self.ids)
+        # Only the user's postings are scored
+        user_postings = self.postings.get(user_id, {})
+        scores: Dict[int, float] = defaultdict(float)
+        for token_id, query_weight in zip(sparse_vector.indices, sparse_vector.values):
+            postings = user_postings.get(token_id)
+            if not postings:
+                continue
+            # Same IDF as Qdrant's IDF modifier, over the whole collection
+            count = self.token_rows[token_id]
+            idf = math.log(1 + (total - count + 0.5) / (count + 0.5))
+            for row, weight in postings.items():
+                if row in allowed:
+                    scores[row] += query_weight * idf * weight
+        return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+    def _to_chunks(self, ranked: List[tuple]) -> List[ScoredChunk]:
+        return [
+            ScoredChunk(
+                id=self.ids[row],
+                score=score,
+                payload={
+                    "page_content": self.payloads[row]["page_content"],
+                    "metadata": dict(self.payloads[row]["metadata"]),
+                },
+            )
+            for row, score in ranked
+        ]
+
+    def search(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector],
+        search_filter: SearchFilter,
+        limit: int,
+    ) -> List[List[ScoredChunk]]:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        with self._locked():
+            rows = self._filter_rows(search_filter)
+            if len(rows) == 0:
+                return [[], []] if sparse_vector is not None else [[]]
+
+            limit = min(limit, len(rows))
+            rankings = [self._to_chunks(self._dense_search(query, rows, limit))]
+            if sparse_vector is not None:
+                ranked = self._sparse_search(
+                    sparse_vector, search_filter.user_id, rows, limit
+                )
+                rankings.append(self._to_chunks(ranked))
+            return rankings
+
+    def close(self) -> None:
+        """Flush the vectors and save the HNSW graph"""
+        with self._lock:
+            if self._log.closed:
+                return
+            with self._locked(exclusive=True):
+                self.vectors.flush()
+                if self._hnsw is not None:
+                    # Rows are numbered alike in every process, any graph is valid
+                    self._hnsw.save_index(self._hnsw_path + ".tmp")
+                    os.replace(self._hnsw_path + ".tmp", self._hnsw_path)
+            self._log.close()
+            self._lock_file.close()
@@ -1,10 +1,82 @@
+import heapq
 import json
-from typing import List, Set, Dict
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Set, Dict, Tuple
 import os
+from sqlalchemy import select
 from models.news_models import NewsArticle, NewsResponse
 from datetime import datetime
 from models.database_models import User
-from config.database import get_db
+from config.database import AsyncSessionLocal
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class UserCategoryCache:
+    """Short-lived cache of each user's news categories
+
+    The news feed reads a user's categories on every page, so they are kept for
+    a few minutes instead of being queried each time. Updating them invalidates
+    the entry in this process. Other API processes see the update when their
+    entry expires.
+
+    Invalidating also bumps the cache's generation. A lookup reads the
+    generation before its query and only stores the result when it has not
+    changed, so a query that was running during an update can't cache the old
+    categories. The generation is shared by all users, so it takes no memory per
+    user, at the cost of skipping a few stores when others update theirs.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        """Initialize the cache
+
+        Args:
+            ttl: Seconds an entry is served for. Defaults to the
+                NEWS_CATEGORY_CACHE_TTL env variable or 300
+            max_size: Users kept, least recently used first out. Defaults to
+                NEWS_CATEGORY_CACHE_SIZE or 10000
+        """
+        self.ttl = ttl or float(os.getenv("NEWS_CATEGORY_CACHE_TTL", "300"))
+        self.max_size = max_size or int(os.getenv("NEWS_CATEGORY_CACHE_SIZE", "10000"))
+        # user_id -> (expiry, categories)
+        self.entries: "OrderedDict[str, Tuple[float, Optional[List[str]]]]" = (
+            OrderedDict()
+        )
+        # Number of invalidations
+        self.generation = 0
+
+    def get(self, user_id: str) -> Tuple[bool, Optional[List[str]]]:
+        """Return whether the user is cached and their categories"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return False, None
+        expiry, categories = entry
+        if expiry < time.monotonic():
+            del self.entries[user_id]
+            return False, None
+        self.entries.move_to_end(user_id)
+        return True, categories
+
+    def set(
+        self, user_id: str, categories: Optional[List[str]], generation: int
+    ) -> None:
+        """Cache the categories unless a user was invalidated since `generation`"""
+        if generation != self.generation:
+            return
+        self.entries[user_id] = (time.monotonic() + self.ttl, categories)
+        self.entries.move_to_end(user_id)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        self.generation += 1
+        self.entries.pop(user_id, None)
+
+
+# Shared so the users router can invalidate what the news feed cached
+user_category_cache = UserCategoryCache()
 
 
 class NewsService:
@@ -14,8 +86,12 @@ class NewsService:
             {}
         )  # user_id -> set of served article URLs
         self.page_size = 10
+        # category -> ascending positions of its articles in self.articles
+        self.category_index: Dict[str, List[int]] = {}
+        # Sorted category names -> positions of the matching articles
+        self.feeds: "OrderedDict[Tuple[str, ...], List[int]]" = OrderedDict()
+        self.feed_cache_size = int(os.getenv("NEWS_FEED_CACHE_SIZE", "1024"))
         self._load_articles()
-        self.db = next(get_db())
 
     def _load_articles(self):
         """Load articles from JSON file"""
@@ -37,30 +113,48 @@ class NewsService:
         except Exception as e:
             print(f"Error loading articles: {e}")
             self.articles = []
+        self._build_category_index()
 
-    def _filter_by_categories(
-        self, articles: List[NewsArticle], preferred_categories: List[str]
-    ) -> List[NewsArticle]:
-        """Filter articles based on user's preferred categories"""
-        if not preferred_categories:
-            return articles
-
-        filtered_articles = []
-        for article in articles:
+    def _build_category_index(self):
+        """Index the positions of the articles in each category"""
+        self.category_index = {}
+        self.feeds.clear()
+        for position, article in enumerate(self.articles):
             if not article.category:
                 continue
 
             # Extract category names from the nested structure
-            article_categories = [cat[0].lower() for cat in article.category]
+            for name in {str(cat[0]).lower() for cat in article.category}:
+                self.category_index.setdefault(name, []).append(position)
 
-            # Check if any of the preferred categories match
-            if any(
-                preferred_cat.lower() in article_categories
-                for preferred_cat in preferred_categories
-            ):
-                filtered_articles.append(article)
+    def _filter_by_categories(
+        self, preferred_categories: Optional[List[str]]
+    ) -> Sequence[int]:
+        """Positions of the articles in any of the preferred categories, in order
 
-        return filtered_articles
+        The postings of the categories are merged once per set of categories,
+        later requests for the same set page through the cached result.
+        """
+        if not preferred_categories:
+            return range(len(self.articles))
+
+        key = tuple(sorted({category.lower() for category in preferred_categories}))
+        feed = self.feeds.get(key)
+        if feed is None:
+            postings = [self.category_index.get(category, []) for category in key]
+            if len(postings) == 1:
+                feed = postings[0]
+            else:
+                # An article in several of the categories appears once
+                feed = []
+                for position in heapq.merge(*postings):
+                    if not feed or feed[-1] != position:
+                        feed.append(position)
+            self.feeds[key] = feed
+            if len(self.feeds) > self.feed_cache_size:
+                self.feeds.popitem(last=False)
+        self.feeds.move_to_end(key)
+        return feed
 
     def _get_unserved_articles(
         self, user_id: str, articles: List[NewsArticle]
@@ -76,18 +170,30 @@ class NewsService:
 
         return unserved
 
-    def get_articles(
+    async def get_user_categories(self, user_id: str) -> Optional[List[str]]:
+        """Return the user's news categories, from the cache when possible"""
+        cached, categories = user_category_cache.get(user_id)
+        if cached:
+            return categories
+
+        generation = user_category_cache.generation
+        # A session per lookup, its connection goes straight back to the pool
+        async with AsyncSessionLocal() as db:
+            categories = await db.scalar(
+                select(User.newcategories).where(User.id == user_id)
+            )
+        user_category_cache.set(user_id, categories, generation)
+        return categories
+
+    async def get_articles(
         self, user_id: str, page: int = 1, preferred_categories: List[str] = None
     ) -> NewsResponse:
         """Get paginated articles based on user preferences"""
         # Filter articles by categories
 
-        db_user = self.db.query(User).filter(User.id == user_id).first()
-        preferred_categories = db_user.newcategories
+        preferred_categories = await self.get_user_categories(user_id)
         print(f"Preferred categories: {preferred_categories}")
-        filtered_articles = self._filter_by_categories(
-            self.articles, preferred_categories
-        )
+        filtered_articles = self._filter_by_categories(preferred_categories)
         print(f"Filtered articles: {len(filtered_articles)}")
 
         # Get unserved articles
@@ -101,7 +207,8 @@ class NewsService:
         end_idx = start_idx + self.page_size
 
         # Get articles for current page
-        current_articles = available_articles[start_idx:end_idx]
+        page_positions = available_articles[start_idx:end_idx]
+        current_articles = [self.articles[position] for position in page_positions]
 
         # # Mark articles as served
         # for article in current_articles:
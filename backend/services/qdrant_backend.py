@@ -0,0 +1,295 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+from typing import Any, Dict, List, Optional, Set
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    FieldCondition,
+    Filter,
+    HnswConfigDiff,
+    KeywordIndexParams,
+    KeywordIndexType,
+    MatchAny,
+    MatchValue,
+    Modifier,
+    PointStruct,
+    QuantizationSearchParams,
+    QueryRequest,
+    QueryResponse,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SparseVector,
+    SparseVectorParams,
+    VectorParams,
+)
+from models.indexer_models import ScoredChunk, SearchFilter, StorageProfile
+from services.vector_backend import VectorBackend
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Chunk metadata fields that searches filter on, user_id is the tenant key
+PAYLOAD_INDEXES = {
+    "metadata.user_id": KeywordIndexParams(
+        type=KeywordIndexType.KEYWORD, is_tenant=True
+    ),
+    "metadata.file_id": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+    "metadata.category_id": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+}
+
+# No global HNSW graph, one graph per user built from the payload index instead
+HNSW_CONFIG = HnswConfigDiff(m=0, payload_m=16)
+
+# Name of the BM25 sparse vector stored next to the unnamed dense vector
+SPARSE_VECTOR_NAME = "bm25"
+
+# Quantized profiles keep a compressed copy in RAM for the search itself, then
+# rescore an oversampled candidate set with the original vectors read from disk
+STORAGE_PROFILES = {
+    "default": StorageProfile(name="default"),
+    "int8": StorageProfile(
+        name="int8",
+        on_disk=True,
+        quantization=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        ),
+        search=QuantizationSearchParams(rescore=True, oversampling=2.0),
+        bytes_per_dimension=1,
+    ),
+    "binary": StorageProfile(
+        name="binary",
+        on_disk=True,
+        quantization=BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=True)
+        ),
+        search=QuantizationSearchParams(rescore=True, oversampling=3.0),
+        bytes_per_dimension=1 / 8,
+    ),
+}
+
+
+def get_storage_profile(name: str = None) -> StorageProfile:
+    """Return a storage profile by name, QDRANT_STORAGE_PROFILE by default"""
+    name = name or os.getenv("QDRANT_STORAGE_PROFILE", "default")
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"Unsupported storage profile: {name}")
+    return STORAGE_PROFILES[name]
+
+
+def qdrant_filter(search_filter: SearchFilter) -> Filter:
+    """Translate a search filter into a Qdrant payload filter"""
+    conditions = [
+        FieldCondition(
+            key="metadata.user_id", match=MatchValue(value=search_filter.user_id)
+        )
+    ]
+    if search_filter.file_ids:
+        conditions.append(
+            FieldCondition(
+                key="metadata.file_id", match=MatchAny(any=search_filter.file_ids)
+            )
+        )
+    if search_filter.category_id:
+        conditions.append(
+            FieldCondition(
+                key="metadata.category_id",
+                match=MatchValue(value=search_filter.category_id),
+            )
+        )
+    return Filter(must=conditions)
+
+
+class QdrantBackend(VectorBackend):
+    """Chunks stored in a Qdrant collection shared by all users
+
+    The storage profile sets how the dense vectors are kept, see STORAGE_PROFILES.
+    It is applied when the collection is created. Existing collections are
+    converted with `python -m services.index_migration`.
+    """
+
+    def __init__(
+        self, collection_name: str, dimension: int, storage_profile: str = None
+    ):
+        self.collection_name = collection_name
+        self.dimension = dimension
+        self.storage_profile = get_storage_profile(storage_profile)
+        self.client = QdrantClient(url=os.getenv("QDRANT_URL"))
+        self.async_client = AsyncQdrantClient(url=os.getenv("QDRANT_URL"))
+        self.hybrid = True
+        self._create_collection()
+
+    def _create_collection(self):
+        """Create the Qdrant collection and its payload indexes if missing"""
+        try:
+            if not self.client.collection_exists(self.collection_name):
+                self.client.create_collection(
+                    collection_name=self.collection_name,
+                    vectors_config=VectorParams(
+                        size=self.dimension,
+                        distance=Distance.COSINE,
+                        on_disk=self.storage_profile.on_disk,
+                    ),
+                    quantization_config=self.storage_profile.quantization,
+                    hnsw_config=HNSW_CONFIG,
+                    sparse_vectors_config={
+                        # Qdrant applies the BM25 IDF from the live corpus
+                        SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+                    },
+                )
+            else:
+                # Collections created before tenant filtering used a global graph
+                self.client.update_collection(
+                    collection_name=self.collection_name, hnsw_config=HNSW_CONFIG
+                )
+                config = self.client.get_collection(self.collection_name).config
+                if type(config.quantization_config) is not type(
+                    self.storage_profile.quantization
+                ):
+                    logger.warning(
+                        f"Collection {self.collection_name} does not use the "
+                        f"{self.storage_profile.name} storage profile, convert it "
+                        "with python -m services.index_migration"
+                    )
+                if SPARSE_VECTOR_NAME not in (config.params.sparse_vectors or {}):
+                    self.hybrid = False
+                    logger.warning(
+                        f"Collection {self.collection_name} has no sparse vector, "
+                        "recreate it to enable hybrid search"
+                    )
+
+            for field_name, field_schema in PAYLOAD_INDEXES.items():
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                )
+        except Exception as e:
+            logger.error(f"Error setting up collection {self.collection_name}: {e}")
+
+    def existing_ids(self, ids: List[int]) -> Set[int]:
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=False,
+            with_vectors=False,
+        )
+        return {point.id for point in points}
+
+    def upsert(
+        self,
+        ids: List[int],
+        vectors: List[List[float]],
+        sparse_vectors: Optional[List[SparseVector]],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        point_vectors = [{"": vector} for vector in vectors]
+        if self.hybrid and sparse_vectors:
+            for point_vector, sparse_vector in zip(point_vectors, sparse_vectors):
+                point_vector[SPARSE_VECTOR_NAME] = sparse_vector
+
+        points = [
+            PointStruct(id=point_id, vector=point_vector, payload=payload)
+            for point_id, point_vector, payload in zip(ids, point_vectors, payloads)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points)
+
+    def _file_selector(self, file_id: str) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(key="metadata.file_id", match=MatchValue(value=file_id))
+            ]
+        )
+
+    def set_payload(self, file_id: str, metadata: Dict[str, Any]) -> None:
+        self.client.set_payload(
+            collection_name=self.collection_name,
+            payload=metadata,
+            key="metadata",
+            points=self._file_selector(file_id),
+        )
+
+    async def aset_payload(self, file_id: str, metadata: Dict[str, Any]) -> None:
+        await self.async_client.set_payload(
+            collection_name=self.collection_name,
+            payload=metadata,
+            key="metadata",
+            points=self._file_selector(file_id),
+        )
+
+    def _requests(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector],
+        search_filter: SearchFilter,
+        limit: int,
+    ) -> List[QueryRequest]:
+        """Build the dense and, for hybrid collections, the sparse query"""
+        query_filter = qdrant_filter(search_filter)
+        requests = [
+            QueryRequest(
+                query=vector,
+                filter=query_filter,
+                params=self.storage_profile.search_params(),
+                limit=limit,
+                with_payload=True,
+            )
+        ]
+        if self.hybrid and sparse_vector is not None:
+            requests.append(
+                QueryRequest(
+                    query=sparse_vector,
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=limit,
+                    with_payload=True,
+                )
+            )
+        return requests
+
+    @staticmethod
+    def _rankings(responses: List[QueryResponse]) -> List[List[ScoredChunk]]:
+        return [
+            [
+                ScoredChunk(id=point.id, score=point.score, payload=point.payload)
+                for point in response.points
+            ]
+            for response in responses
+        ]
+
+    def search(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector],
+        search_filter: SearchFilter,
+        limit: int,
+    ) -> List[List[ScoredChunk]]:
+        # Dense and sparse queries go out in one request and run side by side
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._requests(vector, sparse_vector, search_filter, limit),
+        )
+        return self._rankings(responses)
+
+    async def asearch(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector],
+        search_filter: SearchFilter,
+        limit: int,
+    ) -> List[List[ScoredChunk]]:
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._requests(vector, sparse_vector, search_filter, limit),
+        )
+        return self._rankings(responses)
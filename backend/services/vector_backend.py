@@ -0,0 +1,90 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set
+from qdrant_client.models import SparseVector
+from models.indexer_models import ScoredChunk, SearchFilter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class VectorBackend(ABC):
+    """Storage and retrieval of chunk vectors for the Indexer
+
+    Payloads have the layout {"page_content": ..., "metadata": {...}} with
+    user_id, file_id and category_id in the metadata. A search returns one
+    ranking per retriever, the dense ranking first and, for hybrid backends, the
+    BM25 ranking second, for the Indexer to fuse.
+    """
+
+    # Whether the backend stores sparse vectors and runs the BM25 retrieval
+    hybrid: bool = True
+
+    @abstractmethod
+    def existing_ids(self, ids: List[int]) -> Set[int]:
+        """Return which of the given point ids are already stored"""
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: List[int],
+        vectors: List[List[float]],
+        sparse_vectors: Optional[List[SparseVector]],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        """Store chunks with their dense and, for hybrid backends, sparse vectors"""
+
+    @abstractmethod
+    def set_payload(self, file_id: str, metadata: Dict[str, Any]) -> None:
+        """Merge metadata fields into every chunk of a file"""
+
+    async def aset_payload(self, file_id: str, metadata: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.set_payload, file_id, metadata)
+
+    @abstractmethod
+    def search(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector],
+        search_filter: SearchFilter,
+        limit: int,
+    ) -> List[List[ScoredChunk]]:
+        """Run the dense and, when given a sparse vector, the BM25 retrieval"""
+
+    async def asearch(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector],
+        search_filter: SearchFilter,
+        limit: int,
+    ) -> List[List[ScoredChunk]]:
+        return await asyncio.to_thread(
+            self.search, vector, sparse_vector, search_filter, limit
+        )
+
+
+def get_vector_backend(
+    collection_name: str, dimension: int, backend: Optional[str] = None
+) -> VectorBackend:
+    """Create the backend selected by VECTOR_BACKEND, qdrant or local
+
+    Args:
+        collection_name: Name of the collection holding the chunks
+        dimension: Size of the dense vectors
+        backend: Backend name, overrides VECTOR_BACKEND
+    """
+    backend = backend or os.getenv("VECTOR_BACKEND", "qdrant")
+    if backend == "qdrant":
+        from services.qdrant_backend import QdrantBackend
+
+        return QdrantBackend(collection_name, dimension)
+    if backend == "local":
+        from services.local_backend import LocalBackend
+
+        return LocalBackend(collection_name, dimension)
+    raise ValueError(f"Unsupported vector backend: {backend}")
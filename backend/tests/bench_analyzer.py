@@ -0,0 +1,95 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import random
+import time
+
+# The analyzer builds an Unstructured client, which needs a key but no network
+os.environ.setdefault("UNSTRUCTURED_API_KEY", "benchmark")
+
+from models.highlight_models import DocumentAnalysis, Highlight, HighlightType
+from services.document_analyzer import DocumentAnalyzer
+from utils.llm_cache import LLMCache
+from utils.llm_limiter import llm_limiter
+
+
+class FakeStructuredModel:
+    """Stands in for a structured-output chat model with injected latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def ainvoke(self, prompt: str) -> DocumentAnalysis:
+        # Vary latency so out-of-order completion would show up in the output
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        chunk = prompt.split("Text chunk:")[1].strip()
+        return DocumentAnalysis(
+            highlights=[
+                Highlight(
+                    content=chunk.split(" lorem")[0],
+                    explanation="Benchmark highlight",
+                    highlight_type=HighlightType(
+                        color="green", description="Main idea"
+                    ),
+                )
+            ],
+            total_pages=1,
+            document_title="benchmark",
+        )
+
+
+class FakeChatModel:
+    """Local chat model that only supports structured output"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def with_structured_output(self, schema):
+        return FakeStructuredModel(self.latency)
+
+
+async def run_benchmark(chunk_count: int, latency: float):
+    # Caching would turn the second run into cache hits, so measure without it
+    analyzer = DocumentAnalyzer(
+        llm=FakeChatModel(latency), cache=LLMCache(enabled=False)
+    )
+    chunks = [f"Chunk {i} " + "lorem ipsum " * 300 for i in range(chunk_count)]
+
+    start = time.perf_counter()
+    sequential = []
+    for chunk in chunks:
+        sequential.extend(await analyzer.analyze_chunk(chunk))
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = [
+        highlight
+        for highlights in await analyzer.analyze_chunks(chunks)
+        for highlight in highlights
+    ]
+    concurrent_time = time.perf_counter() - start
+
+    assert [h.content for h in concurrent] == [h.content for h in sequential]
+
+    print(f"Chunks: {chunk_count}, latency: {latency:.2f}s")
+    print(f"Concurrency limit: {llm_limiter.max_concurrency}")
+    print(f"Sequential: {sequential_time:.2f}s")
+    print(f"Concurrent: {concurrent_time:.2f}s")
+    print(f"Speedup: {sequential_time / concurrent_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chunk analysis")
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.concurrency:
+        llm_limiter.max_concurrency = args.concurrency
+
+    asyncio.run(run_benchmark(args.chunks, args.latency))
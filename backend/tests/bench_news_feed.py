@@ -0,0 +1,89 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+from datetime import datetime
+from models.news_models import NewsArticle, NewsSource
+from services.news_service import NewsService
+
+CATEGORIES = [f"category-{i}" for i in range(30)]
+
+
+def build_articles(article_count: int) -> list:
+    """Make articles with one to three weighted categories each"""
+    articles = []
+    for i in range(article_count):
+        categories = random.sample(CATEGORIES, random.randint(1, 3))
+        articles.append(
+            NewsArticle(
+                source=NewsSource(name="bench"),
+                title=f"Article {i}",
+                url=f"https://example.com/{i}",
+                publishedAt=datetime(2025, 1, 1),
+                category=[[name.title(), random.random()] for name in categories],
+            )
+        )
+    return articles
+
+
+def scan(articles: list, preferred_categories: list) -> list:
+    """The filter the index replaces, matching every article on each request"""
+    filtered = []
+    for position, article in enumerate(articles):
+        if not article.category:
+            continue
+        article_categories = [cat[0].lower() for cat in article.category]
+        if any(cat.lower() in article_categories for cat in preferred_categories):
+            filtered.append(position)
+    return filtered
+
+
+def run_benchmark(article_count: int, request_count: int):
+    service = NewsService()
+    service.articles = build_articles(article_count)
+
+    start = time.perf_counter()
+    service._build_category_index()
+    build_time = time.perf_counter() - start
+
+    # Users share a few popular category sets
+    category_sets = [random.sample(CATEGORIES, 3) for _ in range(20)]
+    requests = [
+        (random.choice(category_sets), random.randint(0, 5))
+        for _ in range(request_count)
+    ]
+
+    start = time.perf_counter()
+    scanned = []
+    for categories, page in requests:
+        feed = scan(service.articles, categories)
+        scanned.append(feed[page * 10 : (page + 1) * 10])
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = []
+    for categories, page in requests:
+        feed = service._filter_by_categories(categories)
+        indexed.append(list(feed[page * 10 : (page + 1) * 10]))
+    index_time = time.perf_counter() - start
+
+    assert indexed == scanned
+
+    print(f"Articles: {article_count}, requests: {request_count}")
+    print(f"Index built in {build_time * 1000:.1f}ms")
+    print(f"Scan every article: {scan_time / request_count * 1000:.3f}ms/request")
+    print(f"Category index: {index_time / request_count * 1000:.3f}ms/request")
+    print(f"Speedup: {scan_time / index_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the news feed filter")
+    parser.add_argument("--articles", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    run_benchmark(args.articles, args.requests)
@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import time
+import pymupdf
+from utils.text_anchor import TextAnchor
+
+
+def build_pdf(path: str, page_count: int) -> list:
+    """Write a PDF with distinct sentences on every page and return them"""
+    doc = pymupdf.open()
+    sentences = []
+    for page_number in range(page_count):
+        page = doc.new_page()
+        lines = [
+            f"Sentence {page_number}-{line} about topic {random.randint(0, 10**6)}."
+            for line in range(40)
+        ]
+        sentences.append(lines)
+        page.insert_text((50, 50), "\n".join(lines), fontsize=9)
+    doc.save(path)
+    return sentences
+
+
+def run_benchmark(page_count: int, highlight_count: int):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.pdf")
+        sentences = build_pdf(path, page_count)
+        highlights = []
+        for _ in range(highlight_count):
+            page_number = random.randrange(page_count)
+            highlights.append(
+                (random.choice(sentences[page_number]), [page_number + 1])
+            )
+
+        doc = pymupdf.open(path)
+        start = time.perf_counter()
+        scanned = []
+        for content, _ in highlights:
+            scanned.append(
+                [i for i, page in enumerate(doc) if page.search_for(content)]
+            )
+        scan_time = time.perf_counter() - start
+
+        doc = pymupdf.open(path)
+        start = time.perf_counter()
+        anchor = TextAnchor([page.get_text() for page in doc])
+        build_time = time.perf_counter() - start
+        indexed = []
+        for content, pages in highlights:
+            matches = anchor.find(content, [page - 1 for page in pages])
+            found = sorted({match.segment for match in matches})
+            indexed.append([i for i in found if doc[i].search_for(content)])
+        index_time = time.perf_counter() - start
+
+        assert indexed == scanned
+
+    print(f"Pages: {page_count}, highlights: {highlight_count}")
+    print(f"Scan every page: {scan_time:.2f}s")
+    print(f"Page index: {index_time:.2f}s (index built in {build_time:.2f}s)")
+    print(f"Per highlight: {index_time / highlight_count * 1000:.1f}ms")
+    print(f"Speedup: {scan_time / index_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PDF highlight lookup")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--highlights", type=int, default=50)
+    args = parser.parse_args()
+
+    run_benchmark(args.pages, args.highlights)
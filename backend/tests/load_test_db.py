@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import aiohttp
+
+# Read-only routes that each run database queries
+DEFAULT_PATHS = ["/users/me", "/categories/", "/files/"]
+
+
+async def get_token(session: aiohttp.ClientSession, base_url: str) -> str:
+    """Register a throwaway user and log in as it"""
+    credentials = {"email": f"load-{uuid.uuid4().hex[:8]}@example.com", "password": "x"}
+    async with session.post(f"{base_url}/users/register", json=credentials) as r:
+        r.raise_for_status()
+    async with session.post(f"{base_url}/users/login", json=credentials) as r:
+        r.raise_for_status()
+        return (await r.json())["access_token"]
+
+
+async def run_load(
+    base_url: str, paths: list, total_requests: int, concurrency: int
+) -> dict:
+    """Send requests to the paths in turn with a fixed number in flight"""
+    # The client pool must not be what limits concurrency
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = await get_token(session, base_url)
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies = []
+        errors = 0
+        counter = iter(range(total_requests))
+
+        async def client():
+            nonlocal errors
+            for index in counter:
+                path = paths[index % len(paths)]
+                start = time.perf_counter()
+                async with session.get(f"{base_url}{path}", headers=headers) as r:
+                    await r.read()
+                    if r.status != 200:
+                        errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": total_requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+if __name__ == "__main__":
+    # Start the API first, then run this against it before and after a change:
+    # python tests/load_test_db.py --requests 2000 --concurrency 50
+    parser = argparse.ArgumentParser(description="Load test the database routes")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--path", action="append", dest="paths")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        run_load(
+            args.base_url, args.paths or DEFAULT_PATHS, args.requests, args.concurrency
+        )
+    )
+    print(f"Requests: {result['requests']} ({result['errors']} errors)")
+    print(f"Concurrency: {args.concurrency}")
+    print(f"Throughput: {result['throughput']:.1f} req/s in {result['seconds']:.2f}s")
+    print(
+        f"Latency p50: {result['p50'] * 1000:.1f}ms, "
+        f"p95: {result['p95'] * 1000:.1f}ms, max: {result['max'] * 1000:.1f}ms"
+    )
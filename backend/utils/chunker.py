@@ -0,0 +1,134 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, List, Optional, Tuple
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from models.parser_models import Chunk
+
+# Chunk size and overlap in characters for each consumer of a parsed document
+CHUNK_SIZES: Dict[str, Tuple[int, int]] = {
+    "index": (1000, 200),
+    "analysis": (4000, 200),
+    "summary": (3000, 300),
+}
+
+# Elements that start a new section
+TITLE_TYPES = {"Title"}
+
+# Page furniture that repeats on every page and only adds noise to chunks
+SKIPPED_TYPES = {"Header", "Footer", "PageNumber", "PageBreak"}
+
+
+class _Block:
+    """The text of one element with where it sits in the document"""
+
+    __slots__ = ("text", "page", "section")
+
+    def __init__(self, text: str, page: Optional[int], section: Optional[str]):
+        self.text = text
+        self.page = page
+        self.section = section
+
+
+class _Packer:
+    """Packs blocks into chunks of one size"""
+
+    def __init__(self, size: int, overlap: int):
+        self.size = size
+        self.overlap = overlap
+        self.chunks: List[Chunk] = []
+        self.blocks: List[_Block] = []
+        self.length = 0
+        # Only for elements larger than a whole chunk
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=size, chunk_overlap=overlap, length_function=len
+        )
+
+    def add(self, block: _Block, starts_section: bool) -> None:
+        if len(block.text) > self.size:
+            self._flush(carry=False)
+            for piece in self.splitter.split_text(block.text):
+                self._append(_Block(piece, block.page, block.section))
+                self._flush(carry=False)
+            return
+
+        if self.blocks and (
+            self.length + len(block.text) + 1 > self.size
+            # A new section starts a new chunk unless this one is still small
+            or (starts_section and self.length >= self.size // 2)
+        ):
+            self._flush(carry=not starts_section)
+        self._append(block)
+
+    def _append(self, block: _Block) -> None:
+        self.blocks.append(block)
+        self.length += len(block.text) + 1
+
+    def _flush(self, carry: bool) -> None:
+        if not self.blocks:
+            return
+        self.chunks.append(
+            Chunk(
+                text="\n".join(block.text for block in self.blocks),
+                pages=sorted({b.page for b in self.blocks if b.page is not None}),
+                section=self.blocks[0].section,
+            )
+        )
+
+        # Repeat the trailing blocks that fit in the overlap in the next chunk
+        kept: List[_Block] = []
+        kept_length = 0
+        if carry:
+            for block in reversed(self.blocks[1:]):
+                if kept_length + len(block.text) + 1 > self.overlap:
+                    break
+                kept.insert(0, block)
+                kept_length += len(block.text) + 1
+        self.blocks = kept
+        self.length = kept_length
+
+    def finish(self) -> List[Chunk]:
+        self._flush(carry=False)
+        return self.chunks
+
+
+def chunk_elements(
+    elements: List[Dict], sizes: Optional[Dict[str, Tuple[int, int]]] = None
+) -> Dict[str, List[Chunk]]:
+    """Chunk parsed elements for every consumer in a single pass
+
+    Chunks are built from whole elements. A title starts a new chunk once the
+    current one is half full, tables are kept in one piece, and only elements
+    longer than a chunk are split. Every chunk records the pages it spans and the
+    section it starts in.
+
+    Args:
+        elements: Elements returned by the Unstructured partition API
+        sizes: (size, overlap) per consumer name, defaults to CHUNK_SIZES
+
+    Returns:
+        Chunks per consumer name
+    """
+    packers = {
+        name: _Packer(size, overlap)
+        for name, (size, overlap) in (sizes or CHUNK_SIZES).items()
+    }
+
+    section = None
+    for element in elements:
+        text = (element.get("text") or "").strip()
+        element_type = element.get("type")
+        if not text or element_type in SKIPPED_TYPES:
+            continue
+
+        starts_section = element_type in TITLE_TYPES
+        if starts_section:
+            section = text
+        page = (element.get("metadata") or {}).get("page_number")
+        block = _Block(text, page, section)
+        for packer in packers.values():
+            packer.add(block, starts_section)
+
+    return {name: packer.finish() for name, packer in packers.items()}
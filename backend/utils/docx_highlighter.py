@@ -1,12 +1,30 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy
 from docx import Document
-from docx.shared import RGBColor
 from docx.enum.text import WD_COLOR_INDEX
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
 import logging
-import json
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils.run_spans import apply_spans
+from utils.text_anchor import TextAnchor, anchor_stats
 
 logger = logging.getLogger(__name__)
 
+# Run children that only hold text, runs with anything else (drawings, fields,
+# footnote references) are never split so their content is not duplicated
+_TEXT_TAGS = {
+    qn(tag)
+    for tag in ("w:rPr", "w:t", "w:tab", "w:br", "w:cr", "w:noBreakHyphen")
+}
+
 
 def get_highlight_color(color_name: str) -> WD_COLOR_INDEX:
     """Get highlight color for a given color name"""
@@ -19,10 +37,86 @@ def get_highlight_color(color_name: str) -> WD_COLOR_INDEX:
     return colors.get(color_name, WD_COLOR_INDEX.YELLOW)  # Default to yellow
 
 
+def _iter_paragraphs(container) -> Iterator[Paragraph]:
+    """Yield the paragraphs of a body, cell, header or footer in order"""
+    for block in container.iter_inner_content():
+        if isinstance(block, Table):
+            for row in block.rows:
+                for cell in row.cells:
+                    yield from _iter_paragraphs(cell)
+        else:
+            yield block
+
+
+def _document_paragraphs(doc: Document) -> List[Paragraph]:
+    """Every paragraph of the body, its tables and the headers and footers"""
+    containers = [doc]
+    for section in doc.sections:
+        for part in (
+            section.header,
+            section.first_page_header,
+            section.even_page_header,
+            section.footer,
+            section.first_page_footer,
+            section.even_page_footer,
+        ):
+            # Linked parts belong to an earlier section, reading them adds nothing
+            if not part.is_linked_to_previous:
+                containers.append(part)
+
+    paragraphs = []
+    # Merged cells are returned once per grid column they span
+    seen = set()
+    for container in containers:
+        for paragraph in _iter_paragraphs(container):
+            if paragraph._p not in seen:
+                seen.add(paragraph._p)
+                paragraphs.append(paragraph)
+    return paragraphs
+
+
+def _paragraph_runs(paragraph: Paragraph) -> List[Run]:
+    """Runs of a paragraph including those inside hyperlinks, in order"""
+    runs = []
+    for item in paragraph.iter_inner_content():
+        if isinstance(item, Run):
+            runs.append(item)
+        else:
+            runs.extend(item.runs)
+    return runs
+
+
+def _split_run(run: Run, offset: int) -> Optional[Run]:
+    """Split a run at a text offset, both halves keep its formatting
+
+    Returns:
+        The run holding the text from the offset on, None for runs with more
+        than text
+    """
+    if not all(child.tag in _TEXT_TAGS for child in run._r):
+        return None
+    text = run.text
+    tail = copy.deepcopy(run._r)
+    run._r.addnext(tail)
+    run.text = text[:offset]
+    tail_run = Run(tail, run._parent)
+    tail_run.text = text[offset:]
+    return tail_run
+
+
+def _color_run(run: Run, color: WD_COLOR_INDEX) -> None:
+    run.font.highlight_color = color
+
+
 def add_highlights(highlight_data: list, filename: str) -> str:
     """
     Add color-coded highlights to a DOCX file.
 
+    The document is read once into a map of paragraphs and run offsets that
+    covers the body, tables, headers and footers. All highlights are located
+    in it first and then applied together, splitting only the runs a highlight
+    starts or ends in, so the formatting of the document is kept.
+
     Args:
         highlight_data (list): List of dictionaries containing content and highlight information
         filename (str): Path to the DOCX file
@@ -36,36 +130,37 @@ def add_highlights(highlight_data: list, filename: str) -> str:
         # Open document
         doc = Document(filename)
 
-        # Process each highlight
+        paragraphs = _document_paragraphs(doc)
+        paragraph_runs = [_paragraph_runs(paragraph) for paragraph in paragraphs]
+        anchor = TextAnchor(
+            ["".join(run.text for run in runs) for runs in paragraph_runs]
+        )
+
+        # Locate every highlight before changing any run
+        spans: Dict[int, List[Tuple[int, int, WD_COLOR_INDEX]]] = {}
+        found = 0
         for highlight in highlight_data:
-            content = highlight["content"]
             color = get_highlight_color(highlight["highlight_type"]["color"])
-
-            # Search through all paragraphs
-            for paragraph in doc.paragraphs:
-                if content in paragraph.text:
-                    # Split text and apply highlighting
-                    start_idx = paragraph.text.index(content)
-                    end_idx = start_idx + len(content)
-
-                    # Clear existing runs
-                    for run in paragraph.runs:
-                        run.clear()
-
-                    # Add text before highlight
-                    if start_idx > 0:
-                        run = paragraph.add_run(paragraph.text[:start_idx])
-
-                    # Add highlighted text
-                    run = paragraph.add_run(content)
-                    run.font.highlight_color = color
-
-                    # Add comment if supported by python-docx
-                    # Currently python-docx doesn't support comments directly
-
-                    # Add text after highlight
-                    if end_idx < len(paragraph.text):
-                        run = paragraph.add_run(paragraph.text[end_idx:])
+            matches = anchor.find(highlight["content"])
+            anchor_stats.record("docx", matches[0].score if matches else None)
+            found += bool(matches)
+
+            for match in matches:
+                # A match can run over several paragraphs
+                last = anchor.segment_at(match.end - 1)
+                for index in range(match.segment, last + 1):
+                    paragraph_start, paragraph_end = anchor.segment_range(index)
+                    start = max(match.start, paragraph_start) - paragraph_start
+                    end = min(match.end, paragraph_end) - paragraph_start
+                    if start < end:
+                        spans.setdefault(index, []).append((start, end, color))
+
+        for index, paragraph_spans in spans.items():
+            apply_spans(
+                paragraph_runs[index], paragraph_spans, _split_run, _color_run
+            )
+
+        logger.info("Anchored %d of %d highlights", found, len(highlight_data))
 
         # Save highlighted document
         output_path = str(Path("files") / f"highlighted_{Path(filename).name}")
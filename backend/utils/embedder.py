@@ -1,12 +1,23 @@
+import os
 from langchain.embeddings.base import Embeddings
 from sentence_transformers import SentenceTransformer
 from typing import List
+from utils.embedding_cache import EmbeddingCache
+from utils.embedding_server import EmbeddingServer
+
+
+def load_model(model_name: str):
+    """Load the model in process, or as a replica pool when EMBEDDING_MODE=server"""
+    if os.getenv("EMBEDDING_MODE", "local") == "server":
+        return EmbeddingServer(model_name)
+    return SentenceTransformer(model_name)
 
 
 class Embedder(Embeddings):
     """
     Embedder class that implements LangChain's Embeddings interface.
     Implements Singleton pattern to ensure only one instance is created.
+    Vectors are served from an embedding cache and only misses are encoded.
     """
 
     _instance = None
@@ -14,7 +25,8 @@ class Embedder(Embeddings):
     def __new__(cls, model_name: str = "all-MiniLM-L6-v2"):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.model = SentenceTransformer(model_name)
+            cls._instance.model = load_model(model_name)
+            cls._instance.cache = EmbeddingCache(model_name)
         return cls._instance
 
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
@@ -22,17 +34,30 @@ class Embedder(Embeddings):
         if hasattr(self, "model"):
             return
         else:
-            self.model = SentenceTransformer(model_name)
+            self.model = load_model(model_name)
+            self.cache = EmbeddingCache(model_name)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Encode texts, reusing cached vectors and encoding each miss once"""
+        vectors = self.cache.get_many(texts)
+        misses = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if misses:
+            # Misses get the stored vectors, the same ones later hits return
+            stored = self.cache.set_many(misses, list(self.model.encode(misses)))
+            encoded = dict(zip(misses, stored))
+            vectors = [
+                encoded[text] if vector is None else vector
+                for text, vector in zip(texts, vectors)
+            ]
+        return [vector.tolist() for vector in vectors]
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of documents."""
-        embeddings = self.model.encode(texts)
-        return embeddings.tolist()
+        return self._encode(texts)
 
     def embed_query(self, text: str) -> List[float]:
         """Embed a query."""
-        embedding = self.model.encode([text])[0]
-        return embedding.tolist()
+        return self._encode([text])[0]
 
     def get_sentence_embedding_dimension(self) -> int:
         """Get the dimension of the embeddings."""
@@ -0,0 +1,114 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+import numpy as np
+from diskcache import Cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class EmbeddingCache:
+    """Embedding cache with an in-memory LRU in front of an on-disk store
+
+    Vectors are keyed by model name and text hash and stored on disk as compact
+    float32 or float16 bytes. Lookups and writes work on whole batches so callers
+    only have to encode the texts that missed. Vectors always come back as
+    float32, and a stored vector comes back as it will be read later, so a text
+    gets the same vector whether it hit or missed.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        memory_size: Optional[int] = None,
+        size_limit: Optional[int] = None,
+        dtype: Optional[str] = None,
+    ):
+        """Initialize the cache
+
+        Args:
+            model_name: Name of the embedding model, part of every key
+            cache_dir: Directory of the on-disk store. Defaults to the
+                EMBEDDING_CACHE_DIR env variable or '.cache/embeddings'
+            memory_size: Vectors kept in the in-memory LRU. Defaults to
+                EMBEDDING_CACHE_MEMORY_SIZE or 10000
+            size_limit: Maximum on-disk size in bytes. Defaults to
+                EMBEDDING_CACHE_SIZE_LIMIT or 1 GB
+            dtype: 'float32' or 'float16' storage. Defaults to
+                EMBEDDING_CACHE_DTYPE or 'float32'
+        """
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype or os.getenv("EMBEDDING_CACHE_DTYPE", "float32"))
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported embedding cache dtype: {self.dtype}")
+
+        self.memory_size = memory_size or int(
+            os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "10000")
+        )
+        self.memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # The embedder is called from worker threads, so guard the LRU
+        self._lock = threading.Lock()
+        size_limit = size_limit or int(os.getenv("EMBEDDING_CACHE_SIZE_LIMIT", 2**30))
+        self.disk = Cache(
+            cache_dir or os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings"),
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+
+    def _key(self, text: str) -> str:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        # The dtype is part of the key so switching it never misreads old bytes
+        return f"{self.model_name}:{self.dtype.name}:{text_hash}"
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self.memory[key] = vector
+            self.memory.move_to_end(key)
+            if len(self.memory) > self.memory_size:
+                self.memory.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+            return vector
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for texts, returning None for every miss"""
+        vectors: List[Optional[np.ndarray]] = []
+        with self.disk.transact():
+            for text in texts:
+                key = self._key(text)
+                vector = self._recall(key)
+                if vector is None:
+                    data = self.disk.get(key)
+                    if data is not None:
+                        vector = np.frombuffer(data, dtype=self.dtype).astype(
+                            np.float32
+                        )
+                        self._remember(key, vector)
+                vectors.append(vector)
+        return vectors
+
+    def set_many(
+        self, texts: Sequence[str], vectors: Sequence[np.ndarray]
+    ) -> List[np.ndarray]:
+        """Store vectors for texts in memory and on disk
+
+        Returns:
+            The stored vectors as float32, rounded like later lookups return them
+        """
+        remembered = []
+        with self.disk.transact():
+            for text, vector in zip(texts, vectors):
+                key = self._key(text)
+                stored = np.asarray(vector, dtype=self.dtype)
+                self.disk.set(key, stored.tobytes())
+                remembered.append(stored.astype(np.float32))
+                self._remember(key, remembered[-1])
+        return remembered
@@ -0,0 +1,334 @@
+import os
+import atexit
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Tells the dispatcher thread to stop
+_STOP = object()
+
+
+def _worker_main(model_name: str, connection, torch_threads: int) -> None:
+    """Load a model replica and encode batches until told to stop"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(torch_threads)
+    model = SentenceTransformer(model_name)
+    connection.send(("ready", model.get_sentence_embedding_dimension(), None))
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        batch_id, texts = task
+        try:
+            vectors = model.encode(texts, batch_size=len(texts))
+            connection.send((batch_id, np.asarray(vectors, dtype=np.float32), None))
+        except Exception as e:
+            connection.send((batch_id, None, f"{type(e).__name__}: {e}"))
+
+
+class EmbeddingServer:
+    """Local pool of embedding model replicas behind a dynamic batcher
+
+    Requests from any thread are queued and gathered into batches of up to
+    `max_batch_size` texts, waiting at most `max_wait_ms` for a batch to fill.
+    Each batch goes to the next free replica process, so encoding runs on all
+    cores and outside the GIL of the calling process. It exposes the same
+    `encode` and `get_sentence_embedding_dimension` methods as SentenceTransformer.
+
+    A replica that dies fails the requests of the batch it was encoding and is
+    replaced. Replicas that die before any of them loaded the model are only
+    replaced once one does, as the model may not load at all. When none is left,
+    every waiting and new request fails instead of waiting forever.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        """Start the replica processes and the batching threads
+
+        Args:
+            model_name: SentenceTransformer model loaded by every replica
+            workers: Number of replica processes. Defaults to the
+                EMBEDDING_WORKERS env variable or half the CPU count
+            max_batch_size: Maximum texts per batch. Defaults to
+                EMBEDDING_MAX_BATCH_SIZE or 64
+            max_wait_ms: Maximum time to wait for a batch to fill. Defaults to
+                EMBEDDING_MAX_WAIT_MS or 10
+        """
+        cpu_count = os.cpu_count() or 1
+        self.workers = workers or int(
+            os.getenv("EMBEDDING_WORKERS", max(1, cpu_count // 2))
+        )
+        self.max_batch_size = max_batch_size or int(
+            os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64")
+        )
+        self.max_wait = (
+            max_wait_ms or float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+        ) / 1000
+
+        self.model_name = model_name
+        self._torch_threads = max(1, cpu_count // self.workers)
+        # Spawn rather than fork, torch is not fork-safe once initialized
+        self._context = multiprocessing.get_context("spawn")
+        self._requests: queue.Queue = queue.Queue()
+        # batch id -> (replica, [(future, texts of the request)])
+        self._pending: Dict[int, Tuple[int, List[Tuple[Future, int]]]] = {}
+        self._batch_ids = itertools.count()
+        # (replica, connection) of idle replicas, one batch in flight per replica
+        # so requests pile up into bigger batches. Entries of replaced replicas
+        # are skipped, None means no replica is left.
+        self._free_workers: queue.Queue = queue.Queue()
+        # replica -> batch it is encoding
+        self._assigned: List[Optional[int]] = [None] * self.workers
+        # Replicas that died before the model loaded anywhere
+        self._stopped: Set[int] = set()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._dimension: Optional[int] = None
+        self._error: Optional[RuntimeError] = None
+        self._closed = False
+
+        # Every replica has its own pipe rather than sharing queues. A replica
+        # killed while writing can't leave a lock held for the others, and the
+        # batch a dead replica held is known.
+        self._connections: List[Optional[Connection]] = [None] * self.workers
+        self._processes: list = [None] * self.workers
+        for worker in range(self.workers):
+            self._start_worker(worker)
+
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        threading.Thread(target=self._collect, daemon=True).start()
+        atexit.register(self.close)
+
+        logger.info(
+            f"Started {self.workers} embedding workers for {model_name} "
+            f"(batch size {self.max_batch_size}, wait {self.max_wait * 1000:.0f}ms)"
+        )
+
+    def _start_worker(self, worker: int) -> None:
+        connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.model_name, child_connection, self._torch_threads),
+            daemon=True,
+        )
+        process.start()
+        child_connection.close()
+        self._connections[worker] = connection
+        self._processes[worker] = process
+
+    def _dispatch(self) -> None:
+        """Gather queued requests into batches and hand them to free replicas"""
+        carried = None
+        while True:
+            if carried is None:
+                request = self._requests.get()
+            else:
+                request, carried = carried, None
+            if request is _STOP:
+                break
+            if self._error is not None:
+                request[1].set_exception(self._error)
+                continue
+
+            free = self._free_workers.get()
+            if free is None:
+                request[1].set_exception(self._error)
+                continue
+            worker, connection = free
+            if self._connections[worker] is not connection:
+                # The replica died while idle
+                carried = request
+                continue
+
+            batch = [request]
+            size = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is _STOP or size + len(request[0]) > self.max_batch_size:
+                    # Leave it for the next round
+                    carried = request
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            batch_id = next(self._batch_ids)
+            requests = [(future, len(texts)) for texts, future in batch]
+            with self._lock:
+                # Sent under the lock, so the pipe isn't closed while in use
+                try:
+                    if self._connections[worker] is not connection:
+                        raise OSError("replica was replaced")
+                    connection.send(
+                        (batch_id, [text for texts, _ in batch for text in texts])
+                    )
+                    self._pending[batch_id] = (worker, requests)
+                    self._assigned[worker] = batch_id
+                    requests = []
+                except OSError:
+                    pass
+            for future, _ in requests:
+                future.set_exception(RuntimeError("Embedding worker exited"))
+
+    def _collect(self) -> None:
+        """Read the replicas' pipes and notice the replicas that die"""
+        while not self._closed:
+            handles = {}
+            with self._lock:
+                for worker, connection in enumerate(self._connections):
+                    if connection is not None:
+                        process = self._processes[worker]
+                        handles[connection] = (worker, connection)
+                        handles[process.sentinel] = (worker, process)
+            if not handles:
+                break
+
+            for handle in wait(list(handles), timeout=1):
+                if self._closed:
+                    return
+                worker, owner = handles[handle]
+                if owner is self._connections[worker]:
+                    try:
+                        message = owner.recv()
+                    except (EOFError, OSError):
+                        self._replace_worker(worker)
+                        continue
+                    self._receive(worker, owner, message)
+                elif (
+                    owner is self._processes[worker]
+                    and self._connections[worker] is not None
+                ):
+                    self._replace_worker(worker)
+
+    def _receive(self, worker: int, connection: Connection, message: tuple) -> None:
+        """Handle a replica's message, splitting a batch into request results"""
+        batch_id, vectors, error = message
+        if batch_id == "ready":
+            self._dimension = vectors
+            with self._lock:
+                self._ready.set()
+                # The model loads, so the replicas that died before are tried again
+                for stopped in self._stopped:
+                    self._start_worker(stopped)
+                self._stopped.clear()
+            self._free_workers.put((worker, connection))
+            return
+
+        with self._lock:
+            _, requests = self._pending.pop(batch_id, (worker, []))
+            self._assigned[worker] = None
+        self._free_workers.put((worker, connection))
+        offset = 0
+        for future, count in requests:
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(vectors[offset : offset + count])
+            offset += count
+
+    def _replace_worker(self, worker: int) -> None:
+        """Fail the batch of a replica that died and start a new one"""
+        process = self._processes[worker]
+        connection = self._connections[worker]
+        # Results sent before it died are still delivered
+        try:
+            while connection.poll():
+                self._receive(worker, connection, connection.recv())
+        except (EOFError, OSError):
+            pass
+        process.join()
+        logger.error(f"Embedding worker {worker} exited with code {process.exitcode}")
+
+        error = RuntimeError(f"Embedding worker exited with code {process.exitcode}")
+        with self._lock:
+            connection.close()
+            self._connections[worker] = None
+            batch_id, self._assigned[worker] = self._assigned[worker], None
+            _, requests = self._pending.pop(batch_id, (worker, []))
+            if self._ready.is_set():
+                self._start_worker(worker)
+            else:
+                # A model that can't load would crash every new replica as well
+                self._stopped.add(worker)
+                if len(self._stopped) == self.workers:
+                    self._error = RuntimeError(
+                        "Embedding workers exited before loading the model"
+                    )
+                    self._free_workers.put(None)
+        for future, _ in requests:
+            future.set_exception(error)
+        if self._error is not None:
+            logger.error("No embedding worker is left, failing every request")
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for encoding and return a future of their vectors"""
+        if self._closed:
+            raise RuntimeError("Embedding server is closed")
+        future: Future = Future()
+        if self._error is not None:
+            future.set_exception(self._error)
+        else:
+            self._requests.put((list(texts), future))
+        return future
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        """Encode texts, blocking until every vector is ready"""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), np.float32)
+
+        # Split large requests so they spread across replicas
+        futures = [
+            self.submit(texts[start : start + self.max_batch_size])
+            for start in range(0, len(texts), self.max_batch_size)
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Get the dimension of the embeddings, waiting for the first replica"""
+        while not self._ready.wait(timeout=1):
+            if self._error is not None:
+                raise self._error
+        return self._dimension
+
+    def close(self) -> None:
+        """Stop the batching threads and the replica processes"""
+        if self._closed:
+            return
+        self._closed = True
+        self._requests.put(_STOP)
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    if connection is not None:
+                        connection.send(None)
+                except OSError:
+                    pass
+        for process in self._processes:
+            process.join(timeout=5)
@@ -0,0 +1,351 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import pymupdf
+from models.highlight_models import HighlightPlacement
+from utils import docx_highlighter, pdf_highlighter, ppt_highlighter
+from utils.text_anchor import anchor_stats
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _pdf_page_count(filename: str) -> int:
+    with pymupdf.open(filename) as doc:
+        return len(doc)
+
+
+def highlight_id(highlight: Dict) -> str:
+    """Stable id of a highlight, the same highlight gets it on every analysis"""
+    key = "\0".join(
+        [
+            highlight["content"],
+            highlight["highlight_type"]["color"],
+            highlight["explanation"],
+        ]
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def output_path(filename: str) -> str:
+    """Path the highlighters write a document's highlighted copy to"""
+    return os.path.join("files", f"highlighted_{Path(filename).name}")
+
+
+def _sidecar_path(filename: str) -> str:
+    return output_path(filename) + ".highlights.json"
+
+
+def _file_hash(filename: str) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for byte_block in iter(lambda: f.read(65536), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+
+def _load_rendered(filename: str, source_hash: str) -> Optional[Dict[str, Dict]]:
+    """Highlights in the current highlighted copy, None if it must be redrawn"""
+    try:
+        with open(_sidecar_path(filename), encoding="utf-8") as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if sidecar.get("source_hash") != source_hash or not os.path.exists(
+        output_path(filename)
+    ):
+        return None
+    return sidecar["highlights"]
+
+
+def _clear_rendered(filename: str) -> None:
+    """Forget the highlights of a copy that is about to change"""
+    try:
+        os.remove(_sidecar_path(filename))
+    except FileNotFoundError:
+        pass
+
+
+def _save_rendered(
+    filename: str, source_hash: str, highlights: Dict[str, Dict]
+) -> None:
+    sidecar_path = _sidecar_path(filename)
+    with open(sidecar_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"source_hash": source_hash, "highlights": highlights}, f)
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+
+
+# The worker tasks below record the highlights of a copy themselves. The record
+# is removed before the copy changes and written once it is saved, so a worker
+# killed in between leaves no record and the copy is redrawn on the next run.
+
+
+def _run_highlighter(
+    add_highlights: Callable, highlight_data: list, filename: str, source_hash: str
+) -> Tuple[Optional[str], Dict[str, Dict[str, int]]]:
+    """Run a whole-document highlighter in a worker, returning its anchor stats"""
+    # Worker stats are sent back with each result, so start from zero every time
+    anchor_stats.counts.clear()
+    _clear_rendered(filename)
+    path = add_highlights(highlight_data, filename)
+    if path is not None:
+        highlights = {highlight["id"]: {"pages": []} for highlight in highlight_data}
+        _save_rendered(filename, source_hash, highlights)
+    return path, {
+        document_format: dict(counts)
+        for document_format, counts in anchor_stats.counts.items()
+    }
+
+
+def _draw_pdf(
+    highlight_data: list,
+    filename: str,
+    placements: List[List[HighlightPlacement]],
+    source_hash: str,
+    kept: Dict[str, Dict],
+    removed: Optional[Dict[str, List[int]]] = None,
+) -> Optional[str]:
+    """Draw a PDF's highlighted copy in a worker, or update it when given removed
+
+    Args:
+        highlight_data: Highlights to draw, each with its "id"
+        filename: Path to the PDF file
+        placements: Placements of the highlights to draw
+        source_hash: Hash of the PDF file, recorded with the highlights
+        kept: Recorded highlights that stay in the updated copy
+        removed: Zero-based pages of each highlight id to remove from the copy
+    """
+    _clear_rendered(filename)
+    if removed is None:
+        path = pdf_highlighter.draw_highlights(highlight_data, filename, placements)
+    else:
+        path = pdf_highlighter.update_highlights(
+            highlight_data, output_path(filename), placements, removed
+        )
+    if path is not None:
+        drawn = {
+            highlight["id"]: {"pages": sorted({p.page for p in highlight_placements})}
+            for highlight, highlight_placements in zip(highlight_data, placements)
+        }
+        _save_rendered(filename, source_hash, {**kept, **drawn})
+    return path
+
+
+class HighlightRenderer:
+    """Renders highlighted copies of documents in a pool of worker processes
+
+    PyMuPDF, python-docx and python-pptx are CPU-bound and hold the GIL, so they
+    run outside the API process. PDFs are split into overlapping page ranges
+    that are located in parallel, then merged and drawn in one more task. DOCX
+    and PPTX files are rendered whole by a single worker.
+
+    A document that takes longer than the timeout is given up on and the pool's
+    workers are killed, so a stuck document can't keep holding one. When a
+    worker dies, the pool is replaced and the documents it was rendering are
+    tried once more.
+
+    Every highlight gets a stable id, and the ids in a highlighted copy are
+    stored next to it in a sidecar JSON file. When a document is analyzed again,
+    a PDF copy is updated in place with only the highlights that were added or
+    removed. A DOCX or PPTX copy is reused when the highlights are unchanged.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        pdf_pages_per_task: Optional[int] = None,
+    ):
+        """Initialize the renderer, the worker processes start on first use
+
+        Args:
+            max_workers: Worker processes. Defaults to the HIGHLIGHT_WORKERS env
+                variable or the number of CPUs
+            timeout: Seconds allowed per document. Defaults to
+                HIGHLIGHT_TIMEOUT or 120
+            pdf_pages_per_task: PDF pages located by one task. Defaults to
+                HIGHLIGHT_PDF_PAGES_PER_TASK or 50
+        """
+        self.max_workers = max_workers or int(
+            os.getenv("HIGHLIGHT_WORKERS", str(os.cpu_count() or 1))
+        )
+        self.timeout = timeout or float(os.getenv("HIGHLIGHT_TIMEOUT", "120"))
+        self.pdf_pages_per_task = pdf_pages_per_task or int(
+            os.getenv("HIGHLIGHT_PDF_PAGES_PER_TASK", "50")
+        )
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that runs an event loop and threads can deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _recycle(self) -> None:
+        """Kill the workers of the current pool, the next task starts a new one"""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # Killing a worker breaks the pool, failing the other tasks it was running
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn: Callable, *args):
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker crashed or was killed, later tasks get a new pool
+            if self._executor is executor:
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    async def _locate_pdf(
+        self, highlight_data: list, filename: str
+    ) -> List[List[HighlightPlacement]]:
+        """Locate highlights in a PDF, page ranges in parallel"""
+        if not highlight_data:
+            return []
+        page_count = await asyncio.to_thread(_pdf_page_count, filename)
+        step = self.pdf_pages_per_task
+        # Each range also reads the first page of the next one, so text running
+        # over a range boundary is found whole by the range it starts in
+        ranges = await asyncio.gather(
+            *(
+                self._run(
+                    pdf_highlighter.locate_highlights,
+                    highlight_data,
+                    filename,
+                    first_page,
+                    first_page + step + 1,
+                )
+                for first_page in range(0, max(page_count, 1), step)
+            )
+        )
+        return pdf_highlighter.merge_placements(highlight_data, ranges)
+
+    async def _render_pdf(
+        self,
+        highlight_data: list,
+        filename: str,
+        source_hash: str,
+        rendered: Optional[Dict[str, Dict]],
+    ) -> Optional[str]:
+        """Draw a PDF's highlights, updating the previous copy when there is one"""
+        ids = {highlight["id"] for highlight in highlight_data}
+        if rendered is None:
+            placements = await self._locate_pdf(highlight_data, filename)
+            return await self._run(
+                _draw_pdf, highlight_data, filename, placements, source_hash, {}
+            )
+        kept = {id_: rendered[id_] for id_ in ids if id_ in rendered}
+        added = [h for h in highlight_data if h["id"] not in rendered]
+        removed = {
+            id_: entry["pages"] for id_, entry in rendered.items() if id_ not in ids
+        }
+        logger.info(
+            f"Highlights of {filename}: {len(kept)} kept, {len(added)} added, "
+            f"{len(removed)} removed"
+        )
+        if not added and not removed:
+            return output_path(filename)
+        placements = await self._locate_pdf(added, filename)
+        try:
+            return await self._run(
+                _draw_pdf, added, filename, placements, source_hash, kept, removed
+            )
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            logger.warning(f"Redrawing {filename}, updating it failed: {e}")
+            return await self._render_pdf(highlight_data, filename, source_hash, None)
+
+    async def _render(self, highlight_data: list, filename: str) -> Optional[str]:
+        file_extension = Path(filename).suffix.lower()
+        if file_extension == ".docx":
+            add_highlights = docx_highlighter.add_highlights
+        elif file_extension in [".ppt", ".pptx"]:
+            add_highlights = ppt_highlighter.add_highlights
+        elif file_extension != ".pdf":
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+        # Repeated highlights collapse onto one id
+        highlights = {}
+        for highlight in highlight_data:
+            id_ = highlight_id(highlight)
+            highlights.setdefault(id_, {**highlight, "id": id_})
+        highlight_data = list(highlights.values())
+
+        source_hash = await asyncio.to_thread(_file_hash, filename)
+        rendered = await asyncio.to_thread(_load_rendered, filename, source_hash)
+
+        if file_extension == ".pdf":
+            return await self._render_pdf(
+                highlight_data, filename, source_hash, rendered
+            )
+        if rendered is not None and set(rendered) == set(highlights):
+            # Run formatting can't be restored, so DOCX and PPTX copies are only
+            # reused when nothing changed and are redrawn otherwise
+            return output_path(filename)
+        path, counts = await self._run(
+            _run_highlighter, add_highlights, highlight_data, filename, source_hash
+        )
+        anchor_stats.merge(counts)
+        return path
+
+    async def render(self, highlight_data: list, filename: str) -> Optional[str]:
+        """Write the highlighted copy of a document
+
+        Args:
+            highlight_data: Highlights with their content, type, explanation and
+                optional 1-based pages
+            filename: Path to the PDF, DOCX or PPTX file
+
+        Returns:
+            Path to the highlighted file, None when rendering failed or timed out
+        """
+        for attempt in range(2):
+            try:
+                return await asyncio.wait_for(
+                    self._render(highlight_data, filename), self.timeout
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"Highlighting {filename} took over {self.timeout}s")
+                # The worker is still busy with the document, free it
+                self._recycle()
+                return None
+            except BrokenProcessPool:
+                if attempt:
+                    logger.error(f"Highlighting {filename} broke the worker pool")
+                    return None
+                logger.warning(f"Worker pool broke while highlighting {filename}")
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared so every analyzer in a process uses the same worker pool
+highlight_renderer = HighlightRenderer()
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Optional, Type, TypeVar
+from diskcache import Cache
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class LLMCache:
+    """Persistent cache for structured LLM outputs
+
+    Entries are keyed by model, prompt template version, output schema and a hash
+    of the prompt input, so changing any of them naturally misses the old entries.
+    Reads and writes hit SQLite on disk, so they run in a thread to keep the event
+    loop free.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        size_limit: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        """Initialize the cache
+
+        Args:
+            cache_dir: Directory to store cached results. Defaults to the
+                LLM_CACHE_DIR env variable or '.cache/llm'
+            size_limit: Maximum cache size in bytes before least recently used
+                entries are evicted. Defaults to LLM_CACHE_SIZE_LIMIT or 1 GB
+            enabled: Whether to cache at all. Defaults to LLM_CACHE_ENABLED or True
+        """
+        if enabled is None:
+            enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.cache = None
+        if self.enabled:
+            size_limit = size_limit or int(os.getenv("LLM_CACHE_SIZE_LIMIT", 2**30))
+            self.cache = Cache(
+                cache_dir or os.getenv("LLM_CACHE_DIR", ".cache/llm"),
+                size_limit=size_limit,
+                eviction_policy="least-recently-used",
+            )
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, schema_name: str, text: str) -> str:
+        """Build a cache key from the model, prompt version, schema and input hash"""
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{prompt_version}:{schema_name}:{text_hash}"
+
+    async def get_or_create(
+        self,
+        schema: Type[M],
+        model: str,
+        prompt_version: str,
+        text: str,
+        create: Callable[[], Awaitable[M]],
+    ) -> M:
+        """Return the cached output for an input or create and cache it
+
+        Args:
+            schema: Pydantic model of the structured output
+            model: Name of the model producing the output
+            prompt_version: Version of the prompt template used
+            text: Prompt input the output depends on
+            create: Zero-argument callable running the LLM call on a miss
+
+        Returns:
+            The cached or newly created output
+        """
+        if not self.enabled:
+            return await create()
+
+        namespace = schema.__name__
+        key = self.make_key(model, prompt_version, namespace, text)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.hits[namespace] += 1
+            return schema.model_validate(cached)
+
+        self.misses[namespace] += 1
+        result = await create()
+        await asyncio.to_thread(self.cache.set, key, result.model_dump())
+        return result
+
+    def stats(self) -> Dict:
+        """Hit and miss counts per output schema, plus the cache footprint"""
+        namespaces = set(self.hits) | set(self.misses)
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.cache) if self.enabled else 0,
+            "size_bytes": self.cache.volume() if self.enabled else 0,
+            "schemas": {
+                namespace: {
+                    "hits": self.hits[namespace],
+                    "misses": self.misses[namespace],
+                    "hit_rate": self.hits[namespace]
+                    / (self.hits[namespace] + self.misses[namespace]),
+                }
+                for namespace in sorted(namespaces)
+            },
+        }
+
+
+# Shared cache so every service reads and writes the same entries
+llm_cache = LLMCache()
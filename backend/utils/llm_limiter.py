@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+import random
+import weakref
+from typing import Awaitable, Callable, Optional, TypeVar
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Errors worth retrying: rate limits, timeouts and transient server failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class LLMLimiter:
+    """Bounds concurrent LLM calls and retries rate-limited calls with backoff"""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        """Initialize the limiter
+
+        Args:
+            max_concurrency: Maximum number of LLM calls in flight. Defaults to
+                the LLM_MAX_CONCURRENCY env variable or 8
+            max_retries: Retries per call on retryable errors. Defaults to the
+                LLM_MAX_RETRIES env variable or 5
+            base_delay: Initial backoff delay in seconds
+            max_delay: Upper bound for a single backoff delay in seconds
+        """
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("LLM_MAX_CONCURRENCY", "8")
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("LLM_MAX_RETRIES", "5"))
+        )
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # asyncio primitives are bound to a loop, so keep one semaphore per loop
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def _get_delay(self, error: Exception, attempt: int) -> float:
+        """Backoff delay for an attempt, honouring the server's Retry-After"""
+        response = getattr(error, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+
+        delay = min(self.base_delay * 2**attempt, self.max_delay)
+        # Jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(delay / 2, delay)
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Run an LLM call within the concurrency limit
+
+        Args:
+            call: Zero-argument callable returning the awaitable to run
+
+        Returns:
+            Result of the call
+
+        Raises:
+            The last error if the call keeps failing after all retries
+        """
+        semaphore = self._get_semaphore()
+        attempt = 0
+        while True:
+            async with semaphore:
+                try:
+                    return await call()
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    error = e
+                    delay = self._get_delay(e, attempt)
+
+            # Back off outside the semaphore so other calls keep the slot busy
+            attempt += 1
+            logger.warning(
+                "LLM call failed with %s, retrying in %.1fs (attempt %d/%d)",
+                type(error).__name__,
+                delay,
+                attempt,
+                self.max_retries,
+            )
+            await asyncio.sleep(delay)
+
+
+# Shared limiter so every service draws from the same budget
+llm_limiter = LLMLimiter()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MapReduceProgress(BaseModel):
+    """Progress of a map-reduce run, reported after every finished call"""
+
+    stage: Literal["map", "reduce"] = Field(description="Stage being run")
+    level: int = Field(description="Reduce level, 0 while mapping")
+    completed: int = Field(description="Calls finished in the current stage level")
+    total: int = Field(description="Calls in the current stage level")
+
+
+ProgressCallback = Callable[[MapReduceProgress], None]
+
+
+class MapReduce(Generic[T, R]):
+    """Concurrent map over items followed by a tree reduce in bounded groups
+
+    Every level of the reduce merges groups of at most `group_size` results whose
+    combined size stays within `max_group_size`, so each reduce call sees a bounded
+    input and the number of levels grows with log(items).
+    """
+
+    def __init__(
+        self,
+        map_fn: Callable[[T], Awaitable[R]],
+        reduce_fn: Callable[[List[R]], Awaitable[R]],
+        group_size: int = 8,
+        max_group_size: Optional[int] = None,
+        size_fn: Callable[[R], int] = lambda result: 1,
+    ):
+        """Initialize the engine
+
+        Args:
+            map_fn: Coroutine function turning one item into a result
+            reduce_fn: Coroutine function merging a group of results into one
+            group_size: Maximum number of results merged by one reduce call
+            max_group_size: Optional budget for the combined size of a group
+            size_fn: Size of a single result, measured against max_group_size
+        """
+        if group_size < 2:
+            raise ValueError("group_size must be at least 2")
+
+        self.map_fn = map_fn
+        self.reduce_fn = reduce_fn
+        self.group_size = group_size
+        self.max_group_size = max_group_size
+        self.size_fn = size_fn
+
+    def _group(self, results: List[R]) -> List[List[R]]:
+        """Split results into consecutive groups within the count and size budgets"""
+        groups: List[List[R]] = []
+        current: List[R] = []
+        current_size = 0
+        for result in results:
+            size = self.size_fn(result)
+            over_budget = (
+                self.max_group_size is not None
+                and current_size + size > self.max_group_size
+            )
+            # Groups of one would never shrink the level, so always take two
+            if current and (
+                len(current) >= self.group_size or (over_budget and len(current) > 1)
+            ):
+                groups.append(current)
+                current, current_size = [], 0
+            current.append(result)
+            current_size += size
+        if current:
+            groups.append(current)
+        return groups
+
+    async def _gather(
+        self,
+        calls: Sequence[Awaitable[R]],
+        stage: Literal["map", "reduce"],
+        level: int,
+        on_progress: Optional[ProgressCallback],
+    ) -> List[R]:
+        """Await calls concurrently, reporting progress as each one finishes"""
+        completed = 0
+
+        async def tracked(call: Awaitable[R]) -> R:
+            nonlocal completed
+            result = await call
+            completed += 1
+            if on_progress:
+                on_progress(
+                    MapReduceProgress(
+                        stage=stage, level=level, completed=completed, total=len(calls)
+                    )
+                )
+            return result
+
+        return await asyncio.gather(*(tracked(call) for call in calls))
+
+    async def map(
+        self, items: Sequence[T], on_progress: Optional[ProgressCallback] = None
+    ) -> List[R]:
+        """Map every item concurrently, returning results in item order"""
+        return await self._gather(
+            [self.map_fn(item) for item in items], "map", 0, on_progress
+        )
+
+    async def reduce(
+        self, results: List[R], on_progress: Optional[ProgressCallback] = None
+    ) -> R:
+        """Merge results level by level in bounded groups until one remains
+
+        There is no empty result to return, so callers handle zero items.
+        """
+        if not results:
+            raise ValueError("MapReduce needs at least one result to reduce")
+
+        level = 0
+        while len(results) > 1:
+            level += 1
+            groups = self._group(results)
+            logger.info(
+                "Reducing %d results in %d groups (level %d)",
+                len(results),
+                len(groups),
+                level,
+            )
+            results = await self._gather(
+                [self.reduce_fn(group) for group in groups],
+                "reduce",
+                level,
+                on_progress,
+            )
+
+        return results[0]
+
+    async def run(
+        self, items: Sequence[T], on_progress: Optional[ProgressCallback] = None
+    ) -> R:
+        """Map every item and reduce the results to a single one
+
+        Args:
+            items: Items to map, at least one
+            on_progress: Optional callback receiving progress updates
+
+        Returns:
+            The fully reduced result
+        """
+        if not items:
+            raise ValueError("MapReduce needs at least one item")
+
+        results = await self.map(items, on_progress)
+        return await self.reduce(results, on_progress)
+
+    def stream(self, items: Sequence[T]) -> AsyncIterator[Union[MapReduceProgress, R]]:
+        """Run the map-reduce, yielding progress updates and then the final result"""
+        return stream_progress(lambda on_progress: self.run(items, on_progress))
+
+
+async def stream_progress(
+    run: Callable[[ProgressCallback], Awaitable[R]],
+) -> AsyncIterator[Union[MapReduceProgress, R]]:
+    """Yield the progress a coroutine reports and then its result
+
+    Args:
+        run: Function starting the work with the progress callback to report to
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(run(queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+
+    try:
+        while True:
+            progress = await queue.get()
+            if progress is None:
+                break
+            yield progress
+        yield await task
+    finally:
+        task.cancel()
@@ -1,4 +1,7 @@
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import asyncio
 from typing import List, Dict, Union, Optional
 from pathlib import Path
@@ -7,6 +10,8 @@ from unstructured_client import UnstructuredClient
 from unstructured_client.models import shared, operations
 from diskcache import Cache
 import hashlib
+from models.parser_models import ParsedDocument
+from utils.chunker import chunk_elements
 
 load_dotenv()
 
@@ -14,6 +19,10 @@ load_dotenv()
 class UnstructuredParser:
     """Parser class that uses Unstructured.io API to extract text from various document types"""
 
+    # Partition requests currently in flight, keyed by cache key and shared by
+    # every parser instance so concurrent callers never parse the same file twice
+    _inflight: Dict[str, asyncio.Task] = {}
+
     def __init__(self, api_key: Optional[str] = None, cache_dir: Optional[str] = None):
         """Initialize the parser with API key
 
@@ -86,9 +95,47 @@ class UnstructuredParser:
             List of dictionaries containing extracted elements
         """
         file_path = self._validate_file(file_path)
+        file_hash = await asyncio.to_thread(self._get_file_hash, file_path)
+        return await self._parse_hashed_file(file_path, file_hash, chunking_strategy)
+
+    async def parse_document_async(
+        self, file_path: Union[str, Path], chunking_strategy: Optional[str] = None
+    ) -> ParsedDocument:
+        """Parse a document once and return everything downstream stages need
+
+        Args:
+            file_path: Path to file to parse
+            chunking_strategy: Optional chunking strategy
+
+        Returns:
+            ParsedDocument holding the file hash, raw elements, joined text and
+            the chunks for indexing, analysis and summarization
+        """
+        path = self._validate_file(file_path)
+        file_hash = await asyncio.to_thread(self._get_file_hash, path)
+        elements = await self._parse_hashed_file(path, file_hash, chunking_strategy)
+        return ParsedDocument(
+            file_path=str(file_path),
+            file_hash=file_hash,
+            elements=elements,
+            text=self._elements_to_text(elements),
+            chunks=chunk_elements(elements),
+        )
+
+    async def _parse_hashed_file(
+        self, file_path: Path, file_hash: str, chunking_strategy: Optional[str]
+    ) -> List[Dict]:
+        """Return cached elements or join the single in-flight partition request
 
+        Args:
+            file_path: Validated path to the file
+            file_hash: SHA-256 hash of the file contents
+            chunking_strategy: Optional chunking strategy
+
+        Returns:
+            List of dictionaries containing extracted elements
+        """
         # Generate cache key from file hash and chunking strategy
-        file_hash = self._get_file_hash(file_path)
         cache_key = f"{file_hash}_{chunking_strategy}"
 
         # Check cache first
@@ -96,7 +143,22 @@ class UnstructuredParser:
         if cached_result is not None:
             return cached_result
 
-        # If not in cache, process the file
+        # Callers that miss while a partition is running wait for that one
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(
+                self._partition(file_path, cache_key, chunking_strategy)
+            )
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+
+        # Shield so one cancelled caller does not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _partition(
+        self, file_path: Path, cache_key: str, chunking_strategy: Optional[str]
+    ) -> List[Dict]:
+        """Send the file to the partition API and cache the elements"""
         with open(file_path, "rb") as f:
             files = shared.Files(content=f.read(), file_name=file_path.name)
 
@@ -118,6 +180,11 @@ class UnstructuredParser:
         self.cache.set(cache_key, result)
         return result
 
+    @staticmethod
+    def _elements_to_text(elements: List[Dict]) -> str:
+        """Join the text of all elements into a single string"""
+        return "\n".join(element["text"] for element in elements if "text" in element)
+
     async def extract_text_async(
         self, file_path: Union[str, Path], chunking_strategy: Optional[str] = None
     ) -> str:
@@ -131,7 +198,7 @@ class UnstructuredParser:
             Extracted text as a single string
         """
         elements = await self.parse_file_async(file_path, chunking_strategy)
-        return "\n".join(element["text"] for element in elements if "text" in element)
+        return self._elements_to_text(elements)
 
     # Add sync versions that wrap the async methods
     def parse_file(
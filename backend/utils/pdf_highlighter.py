@@ -1,7 +1,14 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import pymupdf  # import package PyMuPDF
-import textwrap
 import logging
 import json
+from typing import Dict, List, Tuple
+from models.highlight_models import AnchorMatch, HighlightPlacement
+from utils.text_anchor import TextAnchor, anchor_stats
 
 logger = logging.getLogger(__name__)
 
@@ -17,43 +24,147 @@ def get_highlight_color(color_name: str) -> tuple:
     return colors.get(color_name, (1, 1, 0))  # Default to yellow if color not found
 
 
-def add_highlights(highlight_data, filename) -> str:
-    """
-    Add color-coded highlights and suggestions to a PDF file.
+def _page_pieces(anchor: TextAnchor, match: AnchorMatch) -> List[Tuple[int, str]]:
+    """Split a match into the text it covers on each page"""
+    pieces = []
+    for page in range(match.segment, anchor.segment_at(match.end - 1) + 1):
+        page_start, page_end = anchor.segment_range(page)
+        text = anchor.text[max(match.start, page_start) : min(match.end, page_end)]
+        if text.strip():
+            pieces.append((page, text))
+    return pieces
+
+
+def _search_rects(page: pymupdf.Page, text: str) -> list:
+    """Find the rectangles of matched page text"""
+    rects = page.search_for(" ".join(text.split()))
+    if not rects:
+        # Words hyphenated at a line end are only found line by line
+        for line in text.splitlines():
+            if len(line.strip()) > 3:
+                rects.extend(page.search_for(line.strip()))
+    return rects
+
+
+def locate_highlights(
+    highlight_data: list, filename: str, first_page: int = 0, last_page: int = None
+) -> List[List[HighlightPlacement]]:
+    """Find where each highlight goes within a range of pages
+
+    Page ranges of one document can be located in separate processes and their
+    results combined with merge_placements.
 
     Args:
-        highlight_data (list): List of dictionaries containing content and highlight information
-        filename (str): Path to the PDF file
+        highlight_data: Highlights with their content and optional 1-based pages
+        filename: Path to the PDF file
+        first_page: Zero-based first page of the range
+        last_page: Zero-based page after the range, the end of the document
+            when None
 
     Returns:
-        str: Path to the highlighted PDF file
+        For each highlight, its placements on the pages of the range
     """
-    logger.info("Adding highlights to %s", filename)
-
-    # Log highlight data and save to file
-    logger.info("Highlight data: %s", highlight_data)
-    with open("highlight_data.json", "w") as f:
-        json.dump(highlight_data, f)
-    # return "highlighted_" + filename
-    # Open document
     doc = pymupdf.open(filename)
-    filename = filename.split("/")[-1]
+    last_page = len(doc) if last_page is None else min(last_page, len(doc))
+    anchor = TextAnchor([doc[i].get_text() for i in range(first_page, last_page)])
 
-    # Process each highlight
+    placements = []
     for highlight in highlight_data:
-        content = highlight["content"]
+        # Only the pages holding the text are searched for its rectangles
+        hints = [page - 1 - first_page for page in highlight.get("pages", [])]
+        matches = anchor.find(highlight["content"], hints)
+
+        # Every occurrence of the same text on a page is found by one search
+        pieces: Dict[Tuple[int, str], float] = {}
+        for match in matches:
+            for piece in _page_pieces(anchor, match):
+                pieces[piece] = max(pieces.get(piece, 0), match.score)
+
+        highlight_placements = []
+        for (segment, text), score in sorted(pieces.items()):
+            rects = _search_rects(doc[first_page + segment], text)
+            if rects:
+                highlight_placements.append(
+                    HighlightPlacement(
+                        page=first_page + segment,
+                        score=score,
+                        rects=[tuple(rect) for rect in rects],
+                    )
+                )
+        placements.append(highlight_placements)
+    return placements
+
+
+def merge_placements(
+    highlight_data: list, ranges: List[List[List[HighlightPlacement]]]
+) -> List[List[HighlightPlacement]]:
+    """Combine the placements located on separate, possibly overlapping page ranges
+
+    Exact matches are kept wherever they are. Otherwise the best fuzzy match is
+    kept, preferring the pages of the highlight's chunk.
+    """
+    merged = []
+    for index, highlight in enumerate(highlight_data):
+        # Neighbouring ranges share a page, so a placement can be found twice
+        candidates = list(
+            {
+                (p.page, tuple(p.rects)): p
+                for placements in ranges
+                for p in placements[index]
+            }.values()
+        )
+        chosen = [p for p in candidates if p.score == 1.0]
+        if not chosen and candidates:
+            hinted = {page - 1 for page in highlight.get("pages", [])}
+            pool = [p for p in candidates if p.page in hinted] or candidates
+            best = max(p.score for p in pool)
+            chosen = [p for p in pool if p.score == best]
+        anchor_stats.record("pdf", chosen[0].score if chosen else None)
+        merged.append(chosen)
+
+    found = sum(bool(chosen) for chosen in merged)
+    logger.info("Anchored %d of %d highlights", found, len(highlight_data))
+    return merged
+
+
+def _annotate(
+    doc: pymupdf.Document,
+    highlight_data: list,
+    placements: List[List[HighlightPlacement]],
+) -> None:
+    """Add the highlight annotations of located highlights to a document"""
+    for highlight, highlight_placements in zip(highlight_data, placements):
         color = get_highlight_color(highlight["highlight_type"]["color"])
 
         highlight["page"] = 0
-        for i, page in enumerate(doc):
-            rects = page.search_for(content)
-            if rects:
-                highlight["page"] = i
-                # Add highlight annotation
-                annot = page.add_highlight_annot(rects)
-                annot.set_colors(stroke=color)
-                annot.set_info(content=highlight["explanation"])
-                annot.update()
+        for placement in highlight_placements:
+            highlight["page"] = placement.page
+            # The page must outlive its annotation, so keep a reference
+            page = doc[placement.page]
+            # Add highlight annotation
+            annot = page.add_highlight_annot(
+                [pymupdf.Rect(rect) for rect in placement.rects]
+            )
+            annot.set_colors(stroke=color)
+            # The subject carries the highlight id so it can be removed later
+            annot.set_info(
+                content=highlight["explanation"], subject=highlight.get("id", "")
+            )
+            annot.update()
+
+
+def draw_highlights(
+    highlight_data: list,
+    filename: str,
+    placements: List[List[HighlightPlacement]],
+) -> str:
+    """Annotate the located highlights and save the highlighted copy"""
+    # Open document
+    doc = pymupdf.open(filename)
+    filename = filename.split("/")[-1]
+
+    # Process each highlight
+    _annotate(doc, highlight_data, placements)
 
     # Save the document
     try:
@@ -66,7 +177,71 @@ def add_highlights(highlight_data, filename) -> str:
         return None
 
 
+def update_highlights(
+    highlight_data: list,
+    output_path: str,
+    placements: List[List[HighlightPlacement]],
+    removed: Dict[str, List[int]],
+) -> str:
+    """Apply a change of highlights to an existing highlighted copy
+
+    Only the added highlights are drawn and only the pages of the removed ones
+    are visited. The file is saved incrementally, appending the changes instead
+    of rewriting it.
+
+    Args:
+        highlight_data: Highlights to add, each with its "id"
+        output_path: Path of the highlighted copy drawn by draw_highlights
+        placements: Placements of the highlights to add
+        removed: Zero-based pages of each highlight id to remove
+
+    Returns:
+        The output path
+    """
+    doc = pymupdf.open(output_path)
+
+    removed_pages: Dict[int, set] = {}
+    for highlight_id, pages in removed.items():
+        for page_number in pages:
+            removed_pages.setdefault(page_number, set()).add(highlight_id)
+    for page_number, highlight_ids in removed_pages.items():
+        page = doc[page_number]
+        for annot in list(page.annots(types=[pymupdf.PDF_ANNOT_HIGHLIGHT])):
+            if annot.info.get("subject") in highlight_ids:
+                page.delete_annot(annot)
+
+    _annotate(doc, highlight_data, placements)
+    doc.saveIncr()
+    logger.info(
+        "Updated %s: %d highlights added, %d removed",
+        output_path,
+        len(highlight_data),
+        len(removed),
+    )
+    return output_path
+
+
+def add_highlights(highlight_data, filename) -> str:
+    """
+    Add color-coded highlights and suggestions to a PDF file.
+
+    Args:
+        highlight_data (list): List of dictionaries containing content and highlight
+            information, optionally with the 1-based "pages" the content is on
+        filename (str): Path to the PDF file
+
+    Returns:
+        str: Path to the highlighted PDF file
+    """
+    logger.info("Adding %d highlights to %s", len(highlight_data), filename)
+    placements = merge_placements(
+        highlight_data, [locate_highlights(highlight_data, filename)]
+    )
+    return draw_highlights(highlight_data, filename, placements)
+
+
 if __name__ == "__main__":
-    with open("highlight_data.json", "r") as f:
+    # python utils/pdf_highlighter.py highlights.json document.pdf
+    with open(sys.argv[1], "r") as f:
         highlight_data = json.load(f)
-    add_highlights(highlight_data, "test.pdf")
+    add_highlights(highlight_data, sys.argv[2])
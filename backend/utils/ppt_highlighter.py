@@ -1,8 +1,18 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy
 from pptx import Presentation
 from pptx.dml.color import RGBColor
+from pptx.shapes.group import GroupShape
+from pptx.text.text import TextFrame, _Paragraph, _Run
 import logging
-import json
 from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from utils.run_spans import apply_spans
+from utils.text_anchor import TextAnchor, anchor_stats
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +28,59 @@ def get_highlight_color(color_name: str) -> tuple:
     return colors.get(color_name, (255, 255, 0))  # Default to yellow
 
 
+def _iter_text_frames(shapes) -> Iterator[TextFrame]:
+    """Yield the text frames of shapes, inside groups and table cells too"""
+    for shape in shapes:
+        if isinstance(shape, GroupShape):
+            yield from _iter_text_frames(shape.shapes)
+        elif shape.has_table:
+            for row in shape.table.rows:
+                for cell in row.cells:
+                    # Cells covered by a merge hold no text of their own
+                    if not cell.is_spanned:
+                        yield cell.text_frame
+        elif shape.has_text_frame:
+            yield shape.text_frame
+
+
+def _slide_paragraphs(slide) -> List[_Paragraph]:
+    """Paragraphs of a slide's shapes followed by those of its notes"""
+    frames = list(_iter_text_frames(slide.shapes))
+    if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+        frames.append(slide.notes_slide.notes_text_frame)
+    return [paragraph for frame in frames for paragraph in frame.paragraphs]
+
+
+def _split_run(run: _Run, offset: int) -> _Run:
+    """Split a run at a text offset, both halves keep its formatting
+
+    Returns:
+        The run holding the text from the offset on
+    """
+    text = run.text
+    tail = copy.deepcopy(run._r)
+    run._r.addnext(tail)
+    run.text = text[:offset]
+    tail_run = _Run(tail, run._parent)
+    tail_run.text = text[offset:]
+    return tail_run
+
+
+def _color_run(run: _Run, color: tuple) -> None:
+    run.font.fill.solid()
+    run.font.fill.fore_color.rgb = RGBColor(*color)
+
+
 def add_highlights(highlight_data: list, filename: str) -> str:
     """
     Add color-coded highlights to a PowerPoint file.
 
+    The presentation is read once into a text index of every slide's shapes,
+    including groups and tables, and its speaker notes. All highlights are
+    located in it first and then applied together. Runs are split where a
+    highlight starts or ends inside them, so matches across runs are colored
+    exactly.
+
     Args:
         highlight_data (list): List of dictionaries containing content and highlight information
         filename (str): Path to the PPTX file
@@ -47,28 +106,62 @@ def add_highlights(highlight_data: list, filename: str) -> str:
         output_dir = Path("files")
         output_dir.mkdir(exist_ok=True)
 
-        # Process each highlight
+        # Paragraphs of every slide, its groups, tables and notes, read once
+        slides = list(prs.slides)
+        paragraph_runs = []
+        slide_numbers = []
+        for slide_number, slide in enumerate(slides):
+            for paragraph in _slide_paragraphs(slide):
+                paragraph_runs.append(list(paragraph.runs))
+                slide_numbers.append(slide_number)
+        # Run texts, so match offsets line up with the runs to color
+        anchor = TextAnchor(
+            ["".join(run.text for run in runs) for runs in paragraph_runs]
+        )
+
+        # Locate every highlight before changing any run
+        spans: Dict[int, List[Tuple[int, int, tuple]]] = {}
+        notes: Dict[int, List[str]] = {}
+        found = 0
         for highlight in highlight_data:
-            content = highlight["content"]
             color = get_highlight_color(highlight["highlight_type"]["color"])
 
-            # Search through all slides and shapes
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text_frame"):
-                        for paragraph in shape.text_frame.paragraphs:
-                            if content in paragraph.text:
-                                # Split text and apply highlighting
-                                for run in paragraph.runs:
-                                    if content in run.text:
-                                        run.font.fill.solid()
-                                        run.font.fill.fore_color.rgb = RGBColor(*color)
-                                        # Add comment as speaker notes if needed
-                                        if not slide.has_notes_slide:
-                                            slide.notes_slide
-                                        slide.notes_slide.notes_text_frame.text += (
-                                            f"\nHighlight: {highlight['explanation']}"
-                                        )
+            # Search the slides of the highlight's chunk first
+            hinted = set(n - 1 for n in highlight.get("pages", []))
+            hints = [i for i, n in enumerate(slide_numbers) if n in hinted]
+            matches = anchor.find(highlight["content"], hints)
+            anchor_stats.record("pptx", matches[0].score if matches else None)
+            found += bool(matches)
+
+            noted = set()
+            for match in matches:
+                last = anchor.segment_at(match.end - 1)
+                for index in range(match.segment, last + 1):
+                    paragraph_start, paragraph_end = anchor.segment_range(index)
+                    start = max(match.start, paragraph_start) - paragraph_start
+                    end = min(match.end, paragraph_end) - paragraph_start
+                    if start < end:
+                        spans.setdefault(index, []).append((start, end, color))
+                        noted.add(slide_numbers[index])
+            for slide_number in noted:
+                notes.setdefault(slide_number, []).append(highlight["explanation"])
+
+        for index, paragraph_spans in spans.items():
+            apply_spans(
+                paragraph_runs[index], paragraph_spans, _split_run, _color_run
+            )
+
+        # Add the explanations as speaker notes, appended per slide so the
+        # highlights colored in existing notes are kept
+        for slide_number, explanations in notes.items():
+            # Accessing notes_slide creates it when the slide has none
+            notes_frame = slides[slide_number].notes_slide.notes_text_frame
+            if notes_frame is None:
+                continue
+            for explanation in explanations:
+                notes_frame.add_paragraph().text = f"Highlight: {explanation}"
+
+        logger.info("Anchored %d of %d highlights", found, len(highlight_data))
 
         # Save highlighted presentation
         output_path = str(output_dir / f"highlighted_{input_path.name}")
@@ -0,0 +1,41 @@
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[T]],
+    key: Callable[[T], Hashable],
+    k: int = 60,
+    limit: Optional[int] = None,
+    weights: Optional[Sequence[float]] = None,
+) -> List[T]:
+    """Merge ranked result lists with Reciprocal Rank Fusion
+
+    Each item scores sum(weight / (k + rank)) over the lists it appears in, so
+    items ranked well by several retrievers rise to the top without having to
+    compare their raw scores.
+
+    Args:
+        rankings: Result lists, each ordered best first
+        key: Identifies the same item across lists
+        k: Damping constant, larger values flatten the rank differences
+        limit: Number of fused results to return, all of them when None
+        weights: Weight per ranking, 1 for each when None
+
+    Returns:
+        Items ordered by fused score, the first occurrence of each item is kept
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[Hashable, float] = defaultdict(float)
+    items: Dict[Hashable, T] = {}
+
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            item_key = key(item)
+            scores[item_key] += weight / (k + rank)
+            items.setdefault(item_key, item)
+
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return [items[item_key] for item_key in fused[:limit]]
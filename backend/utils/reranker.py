@@ -0,0 +1,143 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """Re-orders search results with a local cross-encoder
+
+    The cross-encoder reads the query and each chunk together, which ranks far
+    better than comparing separate embeddings. All candidates of a search are
+    scored in one batch on a single background thread, and scores are cached per
+    (query, chunk). If scoring does not finish within the latency budget, the
+    results keep their original order and the scoring is cancelled, so searches
+    over budget don't queue up behind each other. Scoring that already started
+    can't be stopped, its scores still land in the cache for the next identical
+    search.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        candidates: Optional[int] = None,
+        timeout_ms: Optional[float] = None,
+        cache_size: Optional[int] = None,
+    ):
+        """Initialize the reranker, the model itself loads on first use
+
+        Args:
+            model_name: CrossEncoder model. Defaults to the RERANK_MODEL env
+                variable or 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+            enabled: Whether to re-rank at all. Defaults to RERANK_ENABLED or False
+            candidates: Results fetched for re-ranking before cutting to the
+                requested limit. Defaults to RERANK_CANDIDATES or 20
+            timeout_ms: Latency budget for scoring. Defaults to
+                RERANK_TIMEOUT_MS or 500
+            cache_size: Scores kept in memory. Defaults to RERANK_CACHE_SIZE or
+                10000
+        """
+        self.model_name = model_name or os.getenv(
+            "RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"
+        )
+        self.enabled = (
+            enabled
+            if enabled is not None
+            else os.getenv("RERANK_ENABLED", "false").lower() == "true"
+        )
+        self.candidates = candidates or int(os.getenv("RERANK_CANDIDATES", "20"))
+        self.timeout = (
+            timeout_ms or float(os.getenv("RERANK_TIMEOUT_MS", "500"))
+        ) / 1000
+        self.cache_size = cache_size or int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+
+        self.scores: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        # One scoring thread, batches queue up instead of competing for cores
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _key(query: str, text: str) -> str:
+        return hashlib.sha256(f"{query}\0{text}".encode("utf-8")).hexdigest()
+
+    def _score(self, query: str, texts: List[str]) -> List[float]:
+        """Score texts against the query, running the model only for misses"""
+        keys = [self._key(query, text) for text in texts]
+        with self._lock:
+            cached = {key: self.scores[key] for key in keys if key in self.scores}
+            for key in cached:
+                self.scores.move_to_end(key)
+
+        misses = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if misses:
+            predicted = self.model.predict(
+                [(query, text) for text in misses.values()], batch_size=len(misses)
+            )
+            with self._lock:
+                for key, score in zip(misses, predicted):
+                    cached[key] = float(score)
+                    self.scores[key] = float(score)
+                while len(self.scores) > self.cache_size:
+                    self.scores.popitem(last=False)
+
+        return [cached[key] for key in keys]
+
+    @staticmethod
+    def _order(results: List[Dict], scores: List[float], limit: int) -> List[Dict]:
+        ranked = sorted(zip(scores, range(len(results))), key=lambda s: -s[0])
+        return [results[index] for _, index in ranked[:limit]]
+
+    def rerank(self, query: str, results: List[Dict], limit: int) -> List[Dict]:
+        """Return the best `limit` results, or the first ones if over budget"""
+        if not self.enabled or len(results) <= 1:
+            return results[:limit]
+
+        texts = [result["content"] or "" for result in results]
+        future = self._executor.submit(self._score, query, texts)
+        try:
+            return self._order(results, future.result(timeout=self.timeout), limit)
+        except FutureTimeoutError:
+            # Only a batch still queued is cancelled
+            future.cancel()
+            logger.warning(f"Re-ranking took over {self.timeout}s, keeping order")
+        except Exception as e:
+            logger.error(f"Error re-ranking results: {e}")
+        return results[:limit]
+
+    async def arerank(self, query: str, results: List[Dict], limit: int) -> List[Dict]:
+        """Async version of rerank that does not block the event loop"""
+        if not self.enabled or len(results) <= 1:
+            return results[:limit]
+
+        texts = [result["content"] or "" for result in results]
+        future = self._executor.submit(self._score, query, texts)
+        try:
+            # On timeout wait_for cancels the wrapped future, and so the batch
+            scores = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.timeout
+            )
+            return self._order(results, scores, limit)
+        except asyncio.TimeoutError:
+            logger.warning(f"Re-ranking took over {self.timeout}s, keeping order")
+        except Exception as e:
+            logger.error(f"Error re-ranking results: {e}")
+        return results[:limit]
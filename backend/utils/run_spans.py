@@ -0,0 +1,47 @@
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
+
+Run = TypeVar("Run")
+Color = TypeVar("Color")
+
+
+def apply_spans(
+    runs: Sequence[Run],
+    spans: List[Tuple[int, int, Color]],
+    split: Callable[[Run, int], Optional[Run]],
+    color: Callable[[Run, Color], None],
+) -> None:
+    """Color character spans of a paragraph, splitting only affected runs
+
+    Shared by the DOCX and PPTX highlighters, which differ only in how a run is
+    split and colored.
+
+    Args:
+        runs: Runs of the paragraph, their texts joined give the span offsets
+        spans: (start, end, color) in highlight order, earlier ones win overlaps
+        split: Splits a run at a text offset and returns the run holding the
+            text from the offset on, or None when the run can't be split
+        color: Colors a whole run
+    """
+    cuts = sorted({offset for start, end, _ in spans for offset in (start, end)})
+    offset = 0
+    for run in runs:
+        run_start, run_end = offset, offset + len(run.text)
+        offset = run_end
+        if not any(start < run_end and end > run_start for start, end, _ in spans):
+            continue
+
+        pieces = [(run_start, run)]
+        for cut in cuts:
+            if run_start < cut < run_end:
+                piece_start, piece = pieces[-1]
+                tail = split(piece, cut - piece_start)
+                if tail is None:
+                    break
+                pieces.append((cut, tail))
+
+        for index, (piece_start, piece) in enumerate(pieces):
+            piece_end = pieces[index + 1][0] if index + 1 < len(pieces) else run_end
+            for start, end, span_color in spans:
+                if start < piece_end and end > piece_start:
+                    color(piece, span_color)
+                    break
@@ -0,0 +1,85 @@
+import os
+import re
+import hashlib
+from collections import Counter
+from typing import Dict, List, Optional
+from qdrant_client.models import SparseVector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Words plus codes joined by - . / such as XJ-9000, v2.1 or ISO/IEC
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+class SparseEncoder:
+    """Encodes text into BM25 term weights for a Qdrant sparse vector
+
+    Tokens are hashed into the sparse index space, so no vocabulary has to be
+    stored or shared between processes. Documents get the BM25 term frequency
+    part, the IDF part is applied by Qdrant at query time through the IDF
+    modifier of the sparse vector, so it always reflects the current corpus.
+    """
+
+    def __init__(
+        self,
+        k1: Optional[float] = None,
+        b: Optional[float] = None,
+        avg_len: float = 256,
+    ):
+        """Initialize the encoder
+
+        Args:
+            k1: BM25 term frequency saturation. Defaults to the BM25_K1 env
+                variable or 1.2
+            b: BM25 length normalization. Defaults to BM25_B or 0.75
+            avg_len: Assumed average document length in tokens
+        """
+        self.k1 = k1 if k1 is not None else float(os.getenv("BM25_K1", "1.2"))
+        self.b = b if b is not None else float(os.getenv("BM25_B", "0.75"))
+        self.avg_len = avg_len
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Lowercase tokens, keeping codes whole and also adding their parts"""
+        tokens = []
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            tokens.append(token)
+            parts = re.split(r"[-./]", token)
+            if len(parts) > 1:
+                tokens.extend(parts)
+        return tokens
+
+    @staticmethod
+    def token_id(token: str) -> int:
+        """Map a token to a stable index in the sparse vector"""
+        return int.from_bytes(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little"
+        )
+
+    def _to_vector(self, weights: Dict[int, float]) -> SparseVector:
+        return SparseVector(indices=list(weights), values=list(weights.values()))
+
+    def encode_document(self, text: str) -> SparseVector:
+        """Encode a chunk with BM25 term frequency weights"""
+        tokens = self.tokenize(text)
+        length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_len)
+
+        weights: Dict[int, float] = {}
+        for token, tf in Counter(tokens).items():
+            token_id = self.token_id(token)
+            # Hash collisions share a slot, so add their weights up
+            weights[token_id] = weights.get(token_id, 0.0) + (
+                tf * (self.k1 + 1) / (tf + length_norm)
+            )
+        return self._to_vector(weights)
+
+    def encode_documents(self, texts: List[str]) -> List[SparseVector]:
+        """Encode a batch of chunks"""
+        return [self.encode_document(text) for text in texts]
+
+    def encode_query(self, text: str) -> SparseVector:
+        """Encode a query, each distinct term counts once"""
+        return self._to_vector(
+            {self.token_id(token): 1.0 for token in set(self.tokenize(text))}
+        )
@@ -0,0 +1,283 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+from models.highlight_models import AnchorMatch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_WORD = re.compile(r"\S+")
+
+# Typographic variants folded onto the plain characters the LLM tends to write
+_FOLD = str.maketrans(
+    {
+        "‘": "'",
+        "’": "'",
+        "‚": "'",
+        "‛": "'",
+        "′": "'",
+        "“": '"',
+        "”": '"',
+        "„": '"',
+        "‟": '"',
+        "″": '"',
+        "‐": "-",
+        "‑": "-",
+        "‒": "-",
+        "–": "-",
+        "—": "-",
+        "―": "-",
+        "−": "-",
+        "…": "...",
+        "ﬀ": "ff",
+        "ﬁ": "fi",
+        "ﬂ": "fl",
+        "ﬃ": "ffi",
+        "ﬄ": "ffl",
+        "­": "",  # Soft hyphen
+        "​": "",  # Zero-width space
+    }
+)
+
+# Characters the LLM adds around quoted content
+_QUOTE_CHARS = " \t\n\"'`‘’“”…"
+
+
+def normalize(text: str) -> Tuple[str, List[int]]:
+    """Normalize text for matching and map it back to the original
+
+    Case, typographic quotes and dashes, ligatures and whitespace runs are
+    folded, and words hyphenated across a line break are joined.
+
+    Returns:
+        The normalized text and, for each of its characters, the offset of the
+        original character it came from
+    """
+    parts: List[str] = []
+    offsets: List[int] = []
+    previous_end = None
+    for word in _WORD.finditer(text):
+        start, end = word.span()
+        if previous_end is not None:
+            gap = text[previous_end:start]
+            if (
+                parts
+                and parts[-1].endswith("-")
+                and "\n" in gap
+                and len(parts[-1]) > 1
+                and parts[-1][-2].isalpha()
+                and text[start].islower()
+            ):
+                # "exam-\nple" becomes "example"
+                parts[-1] = parts[-1][:-1]
+                offsets.pop()
+            else:
+                parts.append(" ")
+                offsets.append(previous_end)
+
+        folded = word.group().translate(_FOLD).lower()
+        if len(folded) == end - start:
+            offsets.extend(range(start, end))
+        else:
+            # Ligatures and removed characters change the length
+            for i, char in enumerate(word.group()):
+                offsets.extend([start + i] * len(char.translate(_FOLD).lower()))
+        parts.append(folded)
+        previous_end = end
+
+    return "".join(parts), offsets
+
+
+class AnchorStats:
+    """Anchoring outcomes per document format, to track the highlight hit rate"""
+
+    def __init__(self):
+        self.counts: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, document_format: str, score: Optional[float]) -> None:
+        """Count one highlight by the score of its match, None when missed"""
+        if score is None:
+            outcome = "missed"
+        elif score == 1.0:
+            outcome = "exact"
+        else:
+            outcome = "fuzzy"
+        self.counts[document_format][outcome] += 1
+
+    def merge(self, counts: Dict[str, Dict[str, int]]) -> None:
+        """Add counts recorded elsewhere, such as in a worker process"""
+        for document_format, outcomes in counts.items():
+            self.counts[document_format].update(outcomes)
+
+    def stats(self) -> Dict:
+        """Exact, fuzzy and missed counts per format with the hit rate"""
+        result = {}
+        for document_format, counts in sorted(self.counts.items()):
+            total = sum(counts.values())
+            result[document_format] = {
+                "exact": counts["exact"],
+                "fuzzy": counts["fuzzy"],
+                "missed": counts["missed"],
+                "hit_rate": (counts["exact"] + counts["fuzzy"]) / total,
+            }
+        return result
+
+
+# Shared so the stats cover every highlighter
+anchor_stats = AnchorStats()
+
+
+class TextAnchor:
+    """Locates highlight content in a document, tolerating small differences
+
+    The document is given as segments (pages, paragraphs, ...) which are joined
+    with newlines and normalized once. A lookup first searches for the normalized
+    content as a substring. When that fails, fixed-length seeds of the content
+    vote for the places where it most likely starts, and only those windows are
+    aligned with difflib to score the match. Segments hinted by the caller are
+    searched before the whole document.
+    """
+
+    def __init__(self, segments: List[str], min_score: Optional[float] = None):
+        """Normalize and index the document
+
+        Args:
+            segments: Text of each page, paragraph or other unit of the document
+            min_score: Smallest similarity accepted for a fuzzy match. Defaults
+                to the ANCHOR_MIN_SCORE env variable or 0.85
+        """
+        self.min_score = min_score or float(os.getenv("ANCHOR_MIN_SCORE", "0.85"))
+        self.segments = segments
+        self.starts: List[int] = []
+        offset = 0
+        for segment in segments:
+            self.starts.append(offset)
+            offset += len(segment) + 1
+        self.text = "\n".join(segments)
+        self.normalized, self.offsets = normalize(self.text)
+        # Normalized offset where each segment starts
+        self.normalized_starts = [
+            bisect_right(self.offsets, start - 1) for start in self.starts
+        ]
+
+    def segment_at(self, offset: int) -> int:
+        """Return the segment holding an offset of the joined text"""
+        return bisect_right(self.starts, offset) - 1
+
+    def segment_range(self, segment: int) -> Tuple[int, int]:
+        """Return the offsets of a segment in the joined text"""
+        start = self.starts[segment]
+        return start, start + len(self.segments[segment])
+
+    def _normalized_range(self, segment: int) -> Tuple[int, int]:
+        start = self.normalized_starts[segment]
+        if segment + 1 < len(self.segments):
+            return start, self.normalized_starts[segment + 1]
+        return start, len(self.normalized)
+
+    def _match(self, start: int, end: int, score: float) -> AnchorMatch:
+        """Convert a normalized span into offsets of the joined text"""
+        original_start = self.offsets[start]
+        return AnchorMatch(
+            start=original_start,
+            end=self.offsets[end - 1] + 1,
+            segment=self.segment_at(original_start),
+            score=score,
+        )
+
+    def _exact(self, needle: str, ranges: List[Tuple[int, int]]) -> List[AnchorMatch]:
+        matches = []
+        for range_start, range_end in ranges:
+            offset = self.normalized.find(needle, range_start, range_end)
+            while offset != -1:
+                matches.append(self._match(offset, offset + len(needle), 1.0))
+                offset = self.normalized.find(
+                    needle, offset + len(needle), range_end
+                )
+        return matches
+
+    def _fuzzy(
+        self, needle: str, ranges: List[Tuple[int, int]]
+    ) -> Optional[AnchorMatch]:
+        length = len(needle)
+        if length < 8:
+            return None
+        seed_length = max(4, min(12, length // 4))
+
+        # Every occurrence of a seed votes for where the content would start
+        votes: Counter = Counter()
+        for seed_start in range(0, length - seed_length + 1, seed_length):
+            seed = needle[seed_start : seed_start + seed_length]
+            for range_start, range_end in ranges:
+                # Seeds like " the " occur everywhere and carry no signal
+                if self.normalized.count(seed, range_start, range_end) > 50:
+                    continue
+                offset = self.normalized.find(seed, range_start, range_end)
+                while offset != -1:
+                    votes[(offset - seed_start) // seed_length] += 1
+                    offset = self.normalized.find(seed, offset + 1, range_end)
+
+        best = None
+        slack = length // 4 + seed_length
+        for bucket, _ in votes.most_common(3):
+            start = bucket * seed_length
+            window_start = max(0, start - slack)
+            window_end = min(len(self.normalized), start + length + slack)
+            window = self.normalized[window_start:window_end]
+            matcher = SequenceMatcher(None, needle, window, autojunk=False)
+            # Stray one or two character matches would stretch the span
+            blocks = [b for b in matcher.get_matching_blocks() if b.size >= 3]
+            if not blocks:
+                continue
+            span_start = window_start + blocks[0].b
+            span_end = window_start + blocks[-1].b + blocks[-1].size
+            matched = sum(block.size for block in blocks)
+            score = 2 * matched / (length + span_end - span_start)
+            if best is None or score > best[2]:
+                best = (span_start, span_end, score)
+
+        if best is None or best[2] < self.min_score:
+            return None
+        return self._match(*best)
+
+    def find(self, content: str, hints: Iterable[int] = ()) -> List[AnchorMatch]:
+        """Locate content in the document
+
+        Args:
+            content: Text to look for, usually written by the LLM
+            hints: Segments to search first. When the content is found in them,
+                the rest of the document is only searched for an exact match.
+
+        Returns:
+            Every exact occurrence, or else the best fuzzy match scoring at least
+            min_score, or an empty list
+        """
+        needle, _ = normalize(content.strip(_QUOTE_CHARS))
+        if not needle:
+            return []
+
+        hinted = sorted(
+            {segment for segment in hints if 0 <= segment < len(self.segments)}
+        )
+        passes = []
+        if hinted:
+            passes.append([self._normalized_range(segment) for segment in hinted])
+        passes.append([(0, len(self.normalized))])
+
+        # An exact match anywhere beats a fuzzy one on the hinted segments
+        for ranges in passes:
+            matches = self._exact(needle, ranges)
+            if matches:
+                return matches
+        for ranges in passes:
+            match = self._fuzzy(needle, ranges)
+            if match is not None:
+                return [match]
+        return []
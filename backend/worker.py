@@ -0,0 +1,65 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+import signal
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def run_worker_process(concurrency: int) -> None:
+    """Run one worker process claiming jobs from the queue"""
+    from config.database import async_engine
+    from services.document_pipeline import PROCESS_FILE_JOB, process_file_job
+    from services.job_queue import get_job_queue
+    from utils.highlight_renderer import highlight_renderer
+
+    job_queue = get_job_queue()
+    job_queue.register(PROCESS_FILE_JOB, process_file_job)
+
+    async def main():
+        # Stop claiming on SIGTERM and let running jobs finish
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(
+            signal.SIGTERM, lambda: asyncio.ensure_future(job_queue.stop())
+        )
+        await job_queue.run_worker(concurrency)
+        await async_engine.dispose()
+
+    asyncio.run(main())
+    highlight_renderer.shutdown()
+
+
+if __name__ == "__main__":
+    processes = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+    concurrency = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+    # Every worker process has its own highlight pool, share the CPUs between them
+    os.environ.setdefault(
+        "HIGHLIGHT_WORKERS", str(max(1, (os.cpu_count() or 1) // processes))
+    )
+
+    logger.info(
+        f"Starting {processes} worker processes with {concurrency} jobs each"
+    )
+    workers = [
+        multiprocessing.Process(target=run_worker_process, args=(concurrency,))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def shutdown(signum, frame):
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for worker in workers:
+        worker.join()